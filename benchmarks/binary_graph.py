@@ -0,0 +1,78 @@
+"""
+Round trip and load time of the binary call graph (call_graph.bin).
+
+The graph is written both as call_graph.json and call_graph.bin. Every entry
+of the binary graph must equal the json entry without its content.
+Then the time to load the json and look up the callers and callees of a few
+functions is compared with memory-mapping the binary graph for the same lookups.
+
+    python benchmarks/binary_graph.py [--lookups 100] [paths...]
+"""
+import argparse
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from code2flow.engine import get_sources, map_it, write_outputs  # noqa: E402
+from code2flow.utils import get_binary_call_graph, get_call_graph  # noqa: E402
+
+
+def check_round_trip(output_dir):
+    graph = get_call_graph(output_dir)
+    with get_binary_call_graph(output_dir) as binary:
+        assert len(binary) == len(graph)
+        assert sorted(binary) == sorted(graph)
+        for name, entry in graph.items():
+            entry.pop('content', None)
+            assert binary.entry(name) == entry, name
+        assert 'no such function' not in binary
+    return graph
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lookups', type=int, default=100)
+    parser.add_argument('paths', nargs='*',
+                        default=[os.path.join(os.path.dirname(__file__), '..', 'projects')])
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    file_groups, all_nodes, edges = map_it(args.paths, get_sources(args.paths), False, True)
+    output_dir = tempfile.mkdtemp(prefix='code2flow_binary_')
+    try:
+        write_outputs(output_dir, file_groups, all_nodes, edges, generate_image=False,
+                      generate_binary=True)
+        names = list(check_round_trip(output_dir))
+        lookups = random.Random(0).choices(names, k=args.lookups)
+
+        start = time.perf_counter()
+        graph = get_call_graph(output_dir)
+        for name in lookups:
+            graph[name]['callers'], graph[name]['callees']
+        json_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with get_binary_call_graph(output_dir) as binary:
+            for name in lookups:
+                binary.callers(name), binary.callees(name)
+        binary_time = time.perf_counter() - start
+
+        json_size = os.path.getsize(os.path.join(output_dir, 'call_graph.json'))
+        binary_size = os.path.getsize(os.path.join(output_dir, 'call_graph.bin'))
+        print(f"{len(names)} entries, round trip ok")
+        print(f"json    {json_size / 1024:9.0f} KB   load + {args.lookups} lookups "
+              f"{json_time * 1000:8.1f} ms")
+        print(f"binary  {binary_size / 1024:9.0f} KB   load + {args.lookups} lookups "
+              f"{binary_time * 1000:8.1f} ms")
+    finally:
+        shutil.rmtree(output_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Size and load time of call_graph.json for every content mode.
+
+The graph is written once per mode. For each mode this reports the size of
+call_graph.json (plus the call_graph.<id>.content sidecar), the time to load
+it with utils.get_call_graph and the time to fetch every function's content
+on demand with utils.get_function_content. The fetched content must be the
+same as the inline content.
+
+    python benchmarks/content_split.py [paths...]
+"""
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from code2flow.engine import get_sources, map_it, write_outputs  # noqa: E402
+from code2flow.processor import CONTENT_MODE  # noqa: E402
+from code2flow.utils import get_call_graph, get_function_content  # noqa: E402
+
+
+def file_size(output_dir):
+    return sum(os.path.getsize(os.path.join(output_dir, file_name))
+               for file_name in os.listdir(output_dir) if file_name.startswith('call_graph.'))
+
+
+def main(paths):
+    logging.disable(logging.CRITICAL)
+    file_groups, all_nodes, edges = map_it(paths, get_sources(paths), False, True)
+
+    root = tempfile.mkdtemp(prefix='code2flow_content_')
+    try:
+        expected = None
+        for mode in (CONTENT_MODE.INLINE, CONTENT_MODE.SIDECAR, CONTENT_MODE.SPANS):
+            output_dir = os.path.join(root, mode)
+            os.makedirs(output_dir)
+            write_outputs(output_dir, file_groups, all_nodes, edges, generate_image=False,
+                          compact_json=True, content_mode=mode)
+
+            start = time.perf_counter()
+            graph = get_call_graph(output_dir)
+            load_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            contents = {name: get_function_content(output_dir, entry)
+                        for name, entry in graph.items()}
+            fetch_time = time.perf_counter() - start
+
+            expected = expected or contents
+            assert contents == expected, f"{mode} content differs from inline"
+            if mode == CONTENT_MODE.SIDECAR:
+                # a second run replaces the sidecar and removes the first one
+                write_outputs(output_dir, file_groups, all_nodes, edges, generate_image=False,
+                              compact_json=True, content_mode=mode)
+                sidecars = [f for f in os.listdir(output_dir) if f.endswith('.content')]
+                assert len(sidecars) == 1, sidecars
+            print(f"{mode:<8} json {os.path.getsize(os.path.join(output_dir, 'call_graph.json')) / 1024:9.0f} KB"
+                  f"   total {file_size(output_dir) / 1024:9.0f} KB"
+                  f"   load {load_time * 1000:8.1f} ms"
+                  f"   fetch all {fetch_time * 1000:8.1f} ms")
+        print(f"{len(expected)} entries")
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or [os.path.join(os.path.dirname(__file__), '..', 'projects')])
@@ -0,0 +1,130 @@
+"""
+Equivalence and incremental updates of the SQLite call graph (call_graph.db).
+
+A copy of the project is mapped and written both as call_graph.json and
+into call_graph.db. Every database entry and query helper must give the same
+answer as the json and the json helpers in utils. Then one function is added
+to one file, the project is mapped again and the database updated: only the
+changed rows are written, and the database must match the new json.
+
+    python benchmarks/database.py [--lookups 100] [project]
+"""
+import argparse
+import collections
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from code2flow.database import GraphDatabase  # noqa: E402
+from code2flow.engine import _write_call_graph, get_sources, map_it  # noqa: E402
+from code2flow.model import GROUP_TYPE, Edge, Node  # noqa: E402
+from code2flow.processor import Processor  # noqa: E402
+from code2flow.utils import get_call_graph, get_file_to_functions, get_parent_dependencies  # noqa: E402
+
+
+def map_project(root, output_dir):
+    """
+    :rtype: Processor
+    """
+    file_groups, all_nodes, edges = map_it([root], get_sources([root]), False, True)
+    all_nodes = sorted({node.uid: node for node in all_nodes}.values(), key=Node.name)
+    processor = Processor(all_nodes, sorted(edges, key=Edge.sort_key))
+    _write_call_graph(output_dir, processor.entries())
+    return processor
+
+
+def reachable(graph, names, depth):
+    ret = {}
+    queue = collections.deque((name, 0) for name in names)
+    while queue:
+        name, d = queue.popleft()
+        if name in ret:
+            continue
+        ret[name] = d
+        if d < depth:
+            queue.extend((callee, d + 1) for callee in graph[name]['callees'])
+    return dict(sorted(ret.items()))
+
+
+def check(db, output_dir, lookups):
+    graph = get_call_graph(output_dir)
+    assert db.names() == list(graph)
+    for name, entry in graph.items():
+        assert db.entry(name) == entry, name
+    assert db.get_file_to_functions() == get_file_to_functions(graph)
+    for name in lookups:
+        if name not in graph:
+            continue
+        file_path = graph[name]['file_name']
+        assert db.get_parent_dependencies([name], file_path) == \
+            get_parent_dependencies(graph, [name], file_path), name
+        assert db.expand_callees([name], 3) == reachable(graph, [name], 3), name
+    return graph
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lookups', type=int, default=100)
+    parser.add_argument('project', nargs='?', default=os.path.join(
+        os.path.dirname(__file__), '..', 'projects', 'repo_agent'))
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    work_dir = tempfile.mkdtemp(prefix='code2flow_db_')
+    root = os.path.join(work_dir, 'project')
+    output_dir = os.path.join(work_dir, 'output')
+    try:
+        shutil.copytree(args.project, root)
+        os.makedirs(output_dir)
+        with GraphDatabase(os.path.join(output_dir, 'call_graph.db')) as db:
+            processor = map_project(root, output_dir)
+            start = time.perf_counter()
+            counts = db.update(processor.winners)
+            print(f"initial write  {time.perf_counter() - start:7.3f} s   "
+                  f"added {counts[0]}, updated {counts[1]}, removed {counts[2]}")
+            names = [call.name for call in processor.winners]
+            lookups = random.Random(0).choices(names, k=args.lookups)
+            graph = check(db, output_dir, lookups)
+
+            start = time.perf_counter()
+            for name in lookups:
+                get_parent_dependencies(get_call_graph(output_dir), [name],
+                                        graph[name]['file_name'])
+            json_time = time.perf_counter() - start
+            start = time.perf_counter()
+            for name in lookups:
+                db.get_parent_dependencies([name], graph[name]['file_name'])
+            db_time = time.perf_counter() - start
+            print(f"{args.lookups} parent dependency queries: json (reloaded per query) "
+                  f"{json_time * 1000:.1f} ms, database {db_time * 1000:.1f} ms")
+
+            # Add a function that calls the first internal function of some file
+            call = next(call for call in processor.winners if call.node.parent is not None
+                        and call.node.parent.group_type == GROUP_TYPE.FILE
+                        and call.node.token != '(global)')
+            with open(call.file_name, 'a') as f:
+                f.write(f'\n\ndef added_by_benchmark():\n    {call.node.token}()\n')
+            processor = map_project(root, output_dir)
+            changes = db.connection.total_changes
+            start = time.perf_counter()
+            counts = db.update(processor.winners)
+            print(f"after an edit  {time.perf_counter() - start:7.3f} s   "
+                  f"added {counts[0]}, updated {counts[1]}, removed {counts[2]}, "
+                  f"{db.connection.total_changes - changes} rows written")
+            check(db, output_dir, lookups)
+            changes = db.connection.total_changes
+            db.update(processor.winners)
+            assert db.connection.total_changes == changes, "unchanged graph wrote rows"
+        print(f"{len(processor.winners)} entries, database matches the json")
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Compare AST node visits and extraction time of the single-pass extractor
+with the previous approach of walking every scope once for calls and once
+more for variables.
+
+    python benchmarks/extraction.py [paths...]
+"""
+import ast
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from code2flow import python  # noqa: E402
+from code2flow.engine import get_sources, make_file_group  # noqa: E402
+from code2flow.model import GROUP_TYPE, Variable  # noqa: E402
+
+REPEAT = 5
+
+
+def _legacy_make_calls(lines):
+    calls = []
+    for tree in lines:
+        for element in ast.walk(tree):
+            if type(element) != ast.Call:
+                continue
+            call = python.get_call_from_func_element(element.func)
+            if call:
+                calls.append(call)
+    return calls
+
+
+def _legacy_make_local_variables(lines, parent):
+    variables = []
+    for tree in lines:
+        for element in ast.walk(tree):
+            if type(element) == ast.Assign:
+                variables += python.process_assign(element)
+            if type(element) in (ast.Import, ast.ImportFrom):
+                variables += python.process_import(element)
+    if parent.group_type == GROUP_TYPE.CLASS:
+        variables.append(Variable('self', parent, lines[0].lineno))
+    return list(filter(None, variables))
+
+
+def _legacy(lines, parent):
+    """
+    The extractor before make_calls_and_variables: one walk for the calls
+    and another for the variables of every scope
+    """
+    return _legacy_make_calls(lines), _legacy_make_local_variables(lines, parent)
+
+
+def measure(trees, make_calls_and_variables):
+    visits = 0
+    walk = ast.walk
+
+    def counting_walk(node):
+        nonlocal visits
+        for element in walk(node):
+            visits += 1
+            yield element
+
+    python.make_calls_and_variables = make_calls_and_variables
+    ast.walk = counting_walk
+    try:
+        for source, tree in trees:
+            make_file_group(tree, source)
+    finally:
+        ast.walk = walk
+    per_run_visits = visits
+
+    best = float('inf')
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        for source, tree in trees:
+            make_file_group(tree, source)
+        best = min(best, time.perf_counter() - start)
+    return per_run_visits, best
+
+
+def main(paths):
+    sources = get_sources(paths)
+    trees = [(source, python.Python.get_tree(source)) for source in sources]
+    single_pass = python.make_calls_and_variables
+    try:
+        legacy_visits, legacy_time = measure(trees, _legacy)
+        new_visits, new_time = measure(trees, single_pass)
+    finally:
+        python.make_calls_and_variables = single_pass
+
+    print(f"{len(sources)} files")
+    print(f"{'':12}{'visits':>12}{'seconds':>12}")
+    print(f"{'two walks':12}{legacy_visits:>12}{legacy_time:>12.4f}")
+    print(f"{'single pass':12}{new_visits:>12}{new_time:>12.4f}")
+    print(f"visits x{legacy_visits / new_visits:.2f} fewer, time x{legacy_time / new_time:.2f} faster")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or [os.path.join(os.path.dirname(__file__), '..', 'projects')])
@@ -0,0 +1,76 @@
+"""
+.gitignore handling of iter_sources against git itself.
+
+For every case a scratch git repository is filled with the same tree of
+empty .py files and the case's .gitignore files. The files iter_sources
+finds must be exactly those `git ls-files --others --exclude-standard`
+lists. Needs git on the PATH.
+
+    python benchmarks/gitignore.py
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from code2flow.engine import iter_sources  # noqa: E402
+
+FILES = ['a.py', 'b.py', 'docs/x.py', 'docs/sub/h.py', 'docs/sub/deep/k.py', 'src/docs/y.py',
+         'src/gen/z_pb2.py', 'src/gen/keep.py', 'build/o.py', 'src/build/o2.py', 't/test_a.py',
+         't/sub/test_b.py', 'x/a1.py', 'x/ab.py', 'x/[b].py', 'foo/bar/baz.py', 'foo/qux/baz.py',
+         'lib/foo/bar/baz.py', 'm/n.py', 'sub/keep.py', 'sub/drop.py', 'sub/inner/keep.py']
+
+# .gitignore contents by directory. A list is the top-level .gitignore
+CASES = [
+    ['/docs/*.py'], ['docs/*.py'], ['*.py', '!a.py'], ['**/gen/'], ['gen/*', '!gen/keep.py'],
+    ['build'], ['/build/'], ['test_*.py'], ['t/**/test_*.py'], ['x/a?.py'], ['x/[ab]*.py'],
+    ['x/[!a]*.py'], ['foo/**/baz.py'], ['**/bar/baz.py'], ['docs/**'],
+    ['docs/**/*.py', '!docs/sub/'], ['src/*/*.py'], ['*_pb2.py'], ['m/'], ['*/'], ['sub'],
+    ['x/\\[b\\].py'], ['**/sub/**'], ['/a.py'],
+    # nested files: the innermost rule that matches wins
+    {'': ['*.py'], 'sub': ['!keep.py']},
+    {'': ['*.py'], 'sub': ['!*.py', 'drop.py']},
+    {'': ['keep.py'], 'sub/inner': ['!keep.py']},
+    {'': ['sub/'], 'sub': ['!keep.py']},
+    {'sub': ['*.py'], 'sub/inner': ['!/keep.py']},
+    {'': ['!sub/drop.py'], 'sub': ['drop.py']},
+]
+
+
+def git_files(root):
+    out = subprocess.run(['git', '-C', root, 'ls-files', '--others', '--exclude-standard'],
+                         capture_output=True, text=True, check=True).stdout
+    return {path for path in out.split('\n') if path.endswith('.py')}
+
+
+def main():
+    mismatches = 0
+    for case in CASES:
+        gitignores = case if isinstance(case, dict) else {'': case}
+        root = tempfile.mkdtemp(prefix='code2flow_gitignore_')
+        try:
+            subprocess.run(['git', 'init', '-q', root], check=True)
+            for path in FILES:
+                os.makedirs(os.path.join(root, os.path.dirname(path)), exist_ok=True)
+                open(os.path.join(root, path), 'w').close()
+            for directory, patterns in gitignores.items():
+                with open(os.path.join(root, directory, '.gitignore'), 'w') as f:
+                    f.write('\n'.join(patterns) + '\n')
+            expected = git_files(root)
+            found = {os.path.relpath(path, root).replace(os.sep, '/')
+                     for path in iter_sources([root])}
+            if found != expected:
+                mismatches += 1
+                print(f"{gitignores}: git only {sorted(expected - found)}, "
+                      f"iter_sources only {sorted(found - expected)}")
+        finally:
+            shutil.rmtree(root)
+    print(f"{len(CASES) - mismatches} of {len(CASES)} cases match git")
+    assert not mismatches
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Cost of resolving module imports for every call (map_it step 6).
+
+Compares scanning the file group's get_variables() for each call, as
+_resolve_module_import used to, with a lookup in the file group's
+precomputed import map.
+
+    python benchmarks/imports.py [paths...]
+"""
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from code2flow.engine import get_sources, map_it  # noqa: E402
+from code2flow.model import GROUP_TYPE, flatten  # noqa: E402
+
+REPEAT = 20
+
+
+def file_group_of(node):
+    group = node.parent
+    while group.group_type != GROUP_TYPE.FILE:
+        group = group.parent
+    return group
+
+
+def scan(file_group, token):
+    for variable in file_group.get_variables():
+        if variable.token == token:
+            return variable.points_to
+    return None
+
+
+def timed(func, lookups):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        results = [func(file_group, token) for file_group, token in lookups]
+    return results, (time.perf_counter() - start) / REPEAT
+
+
+def main(paths):
+    logging.disable(logging.CRITICAL)
+    root = paths[0]
+    file_groups, all_nodes, _ = map_it(root, get_sources(paths), True, True)
+
+    # the two lookups step 6 makes per call
+    lookups = []
+    for call, node in flatten([(c, n) for c in n.calls] for n in all_nodes):
+        file_group = file_group_of(node)
+        lookups.append((file_group, call.owner_token if call.owner_token else call.token))
+
+    scanned, scan_time = timed(scan, lookups)
+    mapped, map_time = timed(lambda file_group, token: file_group.resolve_name(token), lookups)
+    assert scanned == mapped
+
+    print(f"{len(file_groups)} files, {len(lookups)} calls")
+    print(f"scan get_variables()  {scan_time * 1000:8.2f} ms")
+    print(f"import map lookup     {map_time * 1000:8.2f} ms")
+    print(f"speedup               {scan_time / map_time:8.1f}x")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or [os.path.join(os.path.dirname(__file__), '..',
+                                       'projects', 'azure-search-openai-demo')])
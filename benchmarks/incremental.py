@@ -0,0 +1,137 @@
+"""
+IncrementalModel against full rebuilds under random edits.
+
+A copy of the project is loaded into an IncrementalModel. Then, for every
+step, a random file is modified, added, replaced or deleted and the model
+updated. The result must equal map_it run from scratch on the edited tree:
+same json entries, same groups and same leaf/trunk flags. Update and full
+rebuild times are reported.
+
+    python benchmarks/incremental.py [--steps 30] [--seed 0] [--no-trimming] [project]
+
+The Python standard library makes a good large project:
+
+    python benchmarks/incremental.py "$(python -c 'import os; print(os.path.dirname(os.__file__))')/asyncio"
+"""
+import argparse
+import logging
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from code2flow.engine import get_sources, map_it  # noqa: E402
+from code2flow.incremental import IncrementalModel  # noqa: E402
+from code2flow.model import Edge, Node  # noqa: E402
+from code2flow.processor import Processor  # noqa: E402
+
+
+def summary(file_groups, all_nodes, edges):
+    """
+    Everything the outputs are built from
+    """
+    all_nodes = sorted({node.uid: node for node in all_nodes}.values(), key=Node.name)
+    entries = Processor(all_nodes, sorted(edges, key=Edge.sort_key), include_content=False).get()
+    groups = sorted((g.uid, tuple(n.uid for n in g.nodes), tuple(s.uid for s in g.subgroups))
+                    for file_group in file_groups for g in file_group.all_groups())
+    flags = sorted((n.uid, n.is_leaf, n.is_trunk) for n in all_nodes)
+    return entries, groups, flags
+
+
+def edit(rnd, root, step, sources, pool):
+    """
+    Apply one random change to the tree
+    :rtype: (list[str], list[str], list[str]): added, modified, deleted
+    """
+    op = rnd.choice(['modify', 'modify', 'add', 'delete', 'replace'])
+    if op == 'delete' and len(sources) > 2:
+        source = rnd.choice(sources)
+        os.remove(source)
+        return [], [], [source]
+    if op == 'add':
+        source = os.path.join(root, f'added_{step}.py')
+        with open(source, 'w') as f:
+            f.write(rnd.choice(pool))
+        return [source], [], []
+
+    source = rnd.choice(sources)
+    if op == 'replace':
+        text = rnd.choice(pool)
+    else:
+        # rename a definition or blank out an import or a call
+        with open(source) as f:
+            lines = f.read().split('\n')
+        definitions = [i for i, line in enumerate(lines)
+                       if line.strip().startswith(('def ', 'class '))]
+        if definitions and rnd.random() < 0.6:
+            i = rnd.choice(definitions)
+            lines[i] = lines[i].replace('def ', 'def x_', 1).replace('class ', 'class X_', 1)
+        else:
+            statements = [i for i, line in enumerate(lines) if 'import' in line or '(' in line]
+            if statements:
+                i = rnd.choice(statements)
+                lines[i] = lines[i][:len(lines[i]) - len(lines[i].lstrip())] + 'pass'
+        text = '\n'.join(lines)
+    with open(source, 'w') as f:
+        f.write(text)
+    return [], [source], []
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--steps', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-trimming', action='store_true')
+    parser.add_argument('project', nargs='?', default=os.path.join(
+        os.path.dirname(__file__), '..', 'projects', 'repo_agent'))
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+    rnd = random.Random(args.seed)
+
+    work_dir = tempfile.mkdtemp(prefix='code2flow_incremental_')
+    root = os.path.join(work_dir, 'project')
+    try:
+        shutil.copytree(args.project, root)
+        sources = get_sources([root])
+        pool = []
+        for source in sources:
+            with open(source) as f:
+                pool.append(f.read())
+
+        start = time.perf_counter()
+        model = IncrementalModel([root], sources, no_trimming=args.no_trimming,
+                                 skip_parse_errors=True)
+        print(f"{len(sources)} files, model built in {time.perf_counter() - start:.2f} s")
+
+        update_times = []
+        full_times = []
+        for step in range(args.steps):
+            added, modified, deleted = edit(rnd, root, step, get_sources([root]), pool)
+
+            start = time.perf_counter()
+            updated = summary(*model.update(added, modified, deleted))
+            update_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            rebuilt = summary(*map_it([root], get_sources([root]), args.no_trimming, True))
+            full_times.append(time.perf_counter() - start)
+
+            assert updated == rebuilt, (f"step {step}: added {added}, modified {modified}, "
+                                        f"deleted {deleted} differs from a full rebuild")
+
+        print(f"{args.steps} random edits match a full rebuild")
+        print(f"one-file update  median {statistics.median(update_times) * 1000:8.1f} ms   "
+              f"max {max(update_times) * 1000:8.1f} ms")
+        print(f"full rebuild     median {statistics.median(full_times) * 1000:8.1f} ms   "
+              f"max {max(full_times) * 1000:8.1f} ms")
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
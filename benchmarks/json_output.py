@@ -0,0 +1,88 @@
+"""
+Time and peak memory of writing call_graph.json, function content included.
+
+Compares building the whole graph dict and writing it with
+json.dump(indent=4), as before the writer streamed, with streaming the
+entries indented and compact (with orjson when it is installed).
+The indented stream must be byte for byte what json.dump(indent=4) wrote.
+Memory is the peak traced by tracemalloc while writing.
+
+    python benchmarks/json_output.py [paths...]
+
+The Python standard library makes a good large corpus:
+
+    python benchmarks/json_output.py "$(python -c 'import os; print(os.path.dirname(os.__file__))')/email"
+"""
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from code2flow import engine  # noqa: E402
+from code2flow.engine import _write_call_graph, get_sources, map_it  # noqa: E402
+from code2flow.model import Edge, Node  # noqa: E402
+from code2flow.processor import Processor  # noqa: E402
+
+
+def write_whole(output_dir, processor):
+    with open(os.path.join(output_dir, 'call_graph.json'), 'w') as f:
+        json.dump(processor.get(), f, indent=4)
+
+
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main(paths):
+    logging.disable(logging.CRITICAL)
+    file_groups, all_nodes, edges = map_it(paths, get_sources(paths), False, True)
+    all_nodes = sorted({node.uid: node for node in all_nodes}.values(), key=Node.name)
+    processor = Processor(all_nodes, sorted(edges, key=Edge.sort_key))
+
+    output_dir = tempfile.mkdtemp(prefix='code2flow_json_')
+    json_file_name = os.path.join(output_dir, 'call_graph.json')
+    orjson = engine.orjson
+    runs = [
+        ('dict + json.dump(indent=4)', lambda: write_whole(output_dir, processor)),
+        ('streamed, indented', lambda: _write_call_graph(output_dir, processor.entries())),
+        ('streamed, compact (json)', lambda: _write_call_graph(output_dir, processor.entries(),
+                                                              compact=True)),
+    ]
+    if orjson:
+        runs.append(('streamed, compact (orjson)',
+                     lambda: _write_call_graph(output_dir, processor.entries(), compact=True)))
+    try:
+        print(f"{len(processor)} entries")
+        expected = expected_text = None
+        for label, func in runs:
+            engine.orjson = orjson if 'orjson' in label else None
+            elapsed, peak = measure(func)
+            with open(json_file_name) as f:
+                text = f.read()
+            graph = json.loads(text)
+            expected = expected or graph
+            expected_text = expected_text or text
+            assert graph == expected, f"{label} wrote a different graph"
+            if 'indent' in label:
+                assert text == expected_text, f"{label} is not byte for byte json.dump(indent=4)"
+            print(f"{label:<28} {elapsed:7.2f} s   peak {peak / 1024 / 1024:8.1f} MB   "
+                  f"file {os.path.getsize(json_file_name) / 1024 / 1024:8.1f} MB")
+    finally:
+        engine.orjson = orjson
+        shutil.rmtree(output_dir)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or [os.path.join(os.path.dirname(__file__), '..', 'projects')])
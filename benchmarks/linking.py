@@ -0,0 +1,119 @@
+"""
+Scaling of the linking stage (map_it step 6) with the number of worker processes
+on a synthetic project.
+
+The project has `--functions` functions spread over files of 100 functions
+each. The functions call each other across files, through imported names,
+module attributes and methods, and call the standard library.
+Steps 1 to 5 run once. Step 6 is then timed for every worker count and
+checked to give the same links as the serial run.
+
+    python benchmarks/linking.py [--functions 100000] [--workers 1,2,4,8]
+"""
+import argparse
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from code2flow.engine import (_get_paths, _link_all, _resolve_inherits, get_sources,  # noqa: E402
+                              make_file_groups)
+from code2flow.index import DefinitionIndex, ImportIndex  # noqa: E402
+from code2flow.model import flatten  # noqa: E402
+
+FUNCTIONS_PER_FILE = 100
+
+
+def write_project(root, num_functions, seed=0):
+    rnd = random.Random(seed)
+    num_files = max(1, num_functions // FUNCTIONS_PER_FILE)
+    for i in range(num_files):
+        others = [rnd.randrange(num_files) for _ in range(3)]
+        lines = ['import os',
+                 f'import mod_{others[0]}',
+                 f'from mod_{others[1]} import func_{others[1]}_0, Class_{others[1]}',
+                 '',
+                 f'class Class_{i}:',
+                 '    def __init__(self):',
+                 '        self.value = os.getcwd()',
+                 '',
+                 f'    def method_{i}(self):',
+                 '        return self.value.strip()',
+                 '']
+        for j in range(FUNCTIONS_PER_FILE - 2):
+            lines += [f'def func_{i}_{j}(arg):',
+                      f'    obj = Class_{i}()',
+                      f'    obj.method_{i}()',
+                      f'    other = Class_{others[1]}()',
+                      f'    other.method_{others[1]}()',
+                      f'    func_{i}_{rnd.randrange(FUNCTIONS_PER_FILE - 2)}(arg)',
+                      f'    func_{others[1]}_0(arg)',
+                      f'    mod_{others[0]}.func_{others[0]}_{j}(arg)',
+                      '    print(os.path.join(arg, "x"))',
+                      '']
+        with open(os.path.join(root, f'mod_{i}.py'), 'w') as f:
+            f.write('\n'.join(lines))
+
+
+def prepare(root):
+    """
+    map_it steps 1 to 5
+    """
+    file_groups = make_file_groups(get_sources([root]), False, workers=os.cpu_count())
+    all_subgroups = flatten(g.all_groups() for g in file_groups)
+    all_nodes = flatten(g.all_nodes() for g in file_groups)
+    _resolve_inherits(all_subgroups, all_subgroups)
+    imports = ImportIndex(file_groups)
+    for node in all_nodes:
+        node.resolve_variables(imports)
+    for node in all_nodes:
+        node.build_scope()
+    for group in all_subgroups:
+        group.build_scope()
+    all_group_names = {g.token for g in all_subgroups}
+    return all_nodes, DefinitionIndex(all_nodes), all_group_names, _get_paths(root, file_groups)
+
+
+def summary(all_links):
+    return [[(node_b.name() if node_b else None, bad_call.to_string() if bad_call else None)
+             for node_b, bad_call in links] for links in all_links]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--functions', type=int, default=100000)
+    parser.add_argument('--workers', default='1,2,4,8')
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    root = tempfile.mkdtemp(prefix='code2flow_linking_')
+    try:
+        write_project(root, args.functions)
+        start = time.perf_counter()
+        all_nodes, index, all_group_names, paths = prepare(root)
+        print(f"{len(all_nodes)} functions, "
+              f"{sum(len(n.calls) for n in all_nodes)} calls "
+              f"(steps 1-5: {time.perf_counter() - start:.1f} s, {os.cpu_count()} CPUs)")
+
+        expected = None
+        serial_time = None
+        for workers in map(int, args.workers.split(',')):
+            start = time.perf_counter()
+            all_links = _link_all(all_nodes, index, all_group_names, paths, workers)
+            elapsed = time.perf_counter() - start
+            serial_time = serial_time or elapsed
+            links = summary(all_links)
+            expected = expected or links
+            assert links == expected, f"{workers} workers linked differently"
+            print(f"workers={workers:<3} {elapsed:8.2f} s   speedup {serial_time / elapsed:5.2f}x")
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
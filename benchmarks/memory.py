@@ -0,0 +1,60 @@
+"""
+Peak memory of the extraction stage (map_it steps 1 and 2), measured with tracemalloc.
+
+Compares the streaming pipeline, which releases each AST as soon as its file
+group is built, with keeping every AST alive until all groups are built.
+The streaming peak should stay close to the size of the final model plus the
+largest single file, whatever the number of files.
+
+    python benchmarks/memory.py [paths...]
+"""
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from code2flow.engine import get_sources, make_file_group, make_file_groups  # noqa: E402
+from code2flow.python import Python  # noqa: E402
+
+
+def traced(func):
+    """
+    :rtype: (object, int, int): result, retained bytes, peak bytes
+    """
+    gc.collect()
+    tracemalloc.start()
+    result = func()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, retained, peak
+
+
+def all_trees_first(sources):
+    trees = [(source, Python.get_tree(source)) for source in sources]
+    return [make_file_group(tree, source) for source, tree in trees]
+
+
+def main(paths):
+    sources = get_sources(paths)
+
+    largest = 0
+    for source in sources:
+        _, _, peak = traced(lambda: make_file_group(Python.get_tree(source), source))
+        largest = max(largest, peak)
+
+    _, model, streaming_peak = traced(lambda: make_file_groups(sources, False))
+    _, _, legacy_peak = traced(lambda: all_trees_first(sources))
+
+    mb = 1024 * 1024
+    print(f"{len(sources)} files")
+    print(f"model retained after extraction    {model / mb:8.2f} MB")
+    print(f"largest single file (parse+build)  {largest / mb:8.2f} MB")
+    print(f"bound: model + largest file        {(model + largest) / mb:8.2f} MB")
+    print(f"peak, streaming                    {streaming_peak / mb:8.2f} MB")
+    print(f"peak, all ASTs kept                {legacy_peak / mb:8.2f} MB")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or [os.path.join(os.path.dirname(__file__), '..', 'projects')])
@@ -0,0 +1,132 @@
+"""
+Memory used by the extracted model, per function (Node) and per call.
+
+Reports the memory retained by all the file groups built from the sources
+(measured with tracemalloc) and the shallow size of the model objects
+themselves, including their instance dicts if they have any.
+
+The baseline is the model as it was before the classes were slotted and
+their tokens interned: the same sources are extracted again with sys.intern
+disabled, and every model object is then replaced by an unslotted copy,
+with an instance __dict__, holding the same attributes.
+
+    python benchmarks/model_size.py [paths...]
+
+The Python standard library makes a good large corpus:
+
+    python benchmarks/model_size.py "$(python -c 'import os; print(os.path.dirname(os.__file__))')"
+"""
+import gc
+import logging
+import os
+import sys
+import tracemalloc
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from code2flow import model  # noqa: E402
+from code2flow.engine import get_sources, make_file_groups  # noqa: E402
+from code2flow.model import flatten  # noqa: E402
+
+SLOTTED = [model.Node, model.Group, model.Call, model.Variable, model.Edge,
+           model.SourceSpan, model.ScopeTable]
+
+# The same classes without __slots__: attributes live in an instance __dict__
+UNSLOTTED = {cls: type(cls.__name__, (), {}) for cls in SLOTTED}
+
+
+def unslot(obj, memo):
+    """
+    Copy of obj where every slotted model object is an unslotted one
+    """
+    if id(obj) in memo:
+        return memo[id(obj)]
+    if type(obj) in UNSLOTTED:
+        ret = memo[id(obj)] = UNSLOTTED[type(obj)]()
+        for attr in type(obj).__slots__:
+            if hasattr(obj, attr):
+                setattr(ret, attr, unslot(getattr(obj, attr), memo))
+    elif type(obj) is list:
+        ret = memo[id(obj)] = []
+        ret.extend(unslot(item, memo) for item in obj)
+    elif type(obj) is tuple:
+        ret = memo[id(obj)] = tuple(unslot(item, memo) for item in obj)
+    elif type(obj) is dict:
+        ret = memo[id(obj)] = {}
+        ret.update((key, unslot(value, memo)) for key, value in obj.items())
+    else:
+        ret = obj
+    return ret
+
+
+def shallow_size(obj):
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def retained(build):
+    """
+    :rtype: (object, int): what build returned and the memory it retains
+    """
+    gc.collect()
+    tracemalloc.start()
+    ret = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return ret, size
+
+
+def baseline(sources):
+    with mock.patch('sys.intern', lambda token: token):
+        file_groups = make_file_groups(sources, True)
+    return unslot(file_groups, {})
+
+
+def sizes(file_groups):
+    """
+    :rtype: (int, int, int, float, float, float): node, call and variable counts,
+                                                  then their mean shallow sizes
+    """
+    nodes = flatten(g.all_nodes() for g in file_groups)
+    calls = flatten(n.calls for n in nodes)
+    variables = flatten(n.variables for n in nodes)
+    return (len(nodes), len(calls), len(variables),
+            sum(map(shallow_size, nodes)) / len(nodes),
+            sum(map(shallow_size, calls)) / len(calls),
+            sum(map(shallow_size, variables)) / len(variables))
+
+
+def main(paths):
+    logging.disable(logging.CRITICAL)
+    sources = get_sources(paths)
+
+    # all_nodes() and the other Group helpers work on the unslotted copies too
+    for cls in SLOTTED:
+        for name, attr in vars(cls).items():
+            if callable(attr) and not name.startswith('__'):
+                setattr(UNSLOTTED[cls], name, attr)
+
+    old_groups, old_retained = retained(lambda: baseline(sources))
+    old = sizes(old_groups)
+    del old_groups
+    file_groups, new_retained = retained(lambda: make_file_groups(sources, True))
+    new = sizes(file_groups)
+    assert new[:3] == old[:3]
+
+    print(f"{len(file_groups)} files, {new[0]} nodes, {new[1]} calls, {new[2]} variables")
+    print(f"{'':28}{'before':>10}{'after':>10}")
+    print(f"{'model retained (MB)':28}{old_retained / 1024 / 1024:10.2f}"
+          f"{new_retained / 1024 / 1024:10.2f}")
+    print(f"{'retained per node (bytes)':28}{old_retained / old[0]:10.0f}"
+          f"{new_retained / new[0]:10.0f}")
+    for label, i in (('Node object (bytes)', 3), ('Call object (bytes)', 4),
+                     ('Variable object (bytes)', 5)):
+        print(f"{label:28}{old[i]:10.0f}{new[i]:10.0f}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or [os.path.join(os.path.dirname(__file__), '..', 'projects')])
@@ -0,0 +1,52 @@
+"""
+Time to assemble the call_graph.json content (Processor) for a synthetic graph.
+
+    python benchmarks/processor.py [--nodes 100000] [--edges 500000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from code2flow.model import GROUP_TYPE, Edge, Group, Node  # noqa: E402
+from code2flow.processor import Processor  # noqa: E402
+
+NODES_PER_FILE = 100
+
+
+def make_graph(num_nodes, num_edges, seed=0):
+    rnd = random.Random(seed)
+    nodes = []
+    file_group = None
+    for i in range(num_nodes):
+        if i % NODES_PER_FILE == 0:
+            file_index = i // NODES_PER_FILE
+            file_group = Group(f'mod_{file_index}', GROUP_TYPE.FILE, 'File',
+                               file_name=f'pkg/mod_{file_index}.py')
+        node = Node(f'func_{i % NODES_PER_FILE}', [], [], file_group, None, line_number=i)
+        file_group.add_node(node)
+        nodes.append(node)
+    edges = [Edge(rnd.choice(nodes), rnd.choice(nodes)) for _ in range(num_edges)]
+    nodes.sort(key=Node.name)
+    edges.sort(key=Edge.sort_key)
+    return nodes, edges
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--nodes', type=int, default=100000)
+    parser.add_argument('--edges', type=int, default=500000)
+    args = parser.parse_args()
+
+    nodes, edges = make_graph(args.nodes, args.edges)
+    start = time.perf_counter()
+    content = Processor(nodes, edges, include_content=False).get()
+    elapsed = time.perf_counter() - start
+    print(f"{len(nodes)} nodes, {len(edges)} edges, {len(content)} entries: {elapsed:.2f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Cost of the deterministic output ordering in write_outputs on a synthetic graph.
+
+Compares sorting through Node.__lt__ / Edge.__lt__ with names rebuilt on every
+comparison, as before names were cached, with sorting by cached keys.
+Both must give the same order.
+
+    python benchmarks/sorting.py [--nodes 100000] [--edges 300000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from code2flow.model import GROUP_TYPE, Edge, Group, Node  # noqa: E402
+
+NODES_PER_CLASS = 10
+CLASSES_PER_FILE = 10
+
+
+def legacy_name(node):
+    group = node.first_group()
+    if not group:
+        return f'EXTERNAL::{node.token}'
+    return f"{node.first_group().filename()}::{node.token_with_ownership()}"
+
+
+class LegacyNode():
+    """
+    Orders like Node.__lt__ did before names were cached
+    """
+    __slots__ = ('node',)
+
+    def __init__(self, node):
+        self.node = node
+
+    def __lt__(self, other):
+        return legacy_name(self.node) < legacy_name(other.node)
+
+
+class LegacyEdge():
+    __slots__ = ('edge',)
+
+    def __init__(self, edge):
+        self.edge = edge
+
+    def __lt__(self, other):
+        if self.edge.node0 == other.edge.node0:
+            return legacy_name(self.edge.node1) < legacy_name(other.edge.node1)
+        return legacy_name(self.edge.node0) < legacy_name(other.edge.node0)
+
+
+def make_graph(num_nodes, num_edges, seed=0):
+    rnd = random.Random(seed)
+    nodes = []
+    file_index = 0
+    while len(nodes) < num_nodes:
+        file_name = f'pkg/mod_{file_index}.py'
+        file_group = Group(f'mod_{file_index}', GROUP_TYPE.FILE, 'File', file_name=file_name)
+        for c in range(CLASSES_PER_FILE):
+            class_group = Group(f'Class_{c}', GROUP_TYPE.CLASS, 'Class', parent=file_group)
+            file_group.add_subgroup(class_group)
+            for n in range(NODES_PER_CLASS):
+                node = Node(f'method_{n}', [], [], class_group, None, line_number=n)
+                class_group.add_node(node)
+                nodes.append(node)
+        file_index += 1
+    nodes = nodes[:num_nodes]
+    rnd.shuffle(nodes)
+    edges = [Edge(rnd.choice(nodes), rnd.choice(nodes)) for _ in range(num_edges)]
+    return nodes, edges
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--nodes', type=int, default=100000)
+    parser.add_argument('--edges', type=int, default=300000)
+    args = parser.parse_args()
+
+    nodes, edges = make_graph(args.nodes, args.edges)
+
+    legacy_nodes, legacy_nodes_time = timed(
+        lambda: [n.node for n in sorted(map(LegacyNode, nodes))])
+    legacy_edges, legacy_edges_time = timed(
+        lambda: [e.edge for e in sorted(map(LegacyEdge, edges))])
+
+    # names are computed on first use, so this includes filling the cache
+    keyed_nodes, keyed_nodes_time = timed(lambda: sorted(nodes, key=Node.name))
+    keyed_edges, keyed_edges_time = timed(lambda: sorted(edges, key=Edge.sort_key))
+
+    assert keyed_nodes == legacy_nodes
+    assert keyed_edges == legacy_edges
+
+    print(f"{len(nodes)} nodes, {len(edges)} edges")
+    print(f"nodes  __lt__ {legacy_nodes_time:7.2f} s   key {keyed_nodes_time:7.2f} s   "
+          f"{legacy_nodes_time / keyed_nodes_time:5.1f}x")
+    print(f"edges  __lt__ {legacy_edges_time:7.2f} s   key {keyed_edges_time:7.2f} s   "
+          f"{legacy_edges_time / keyed_edges_time:5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
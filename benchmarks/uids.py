@@ -0,0 +1,100 @@
+"""
+Uniqueness and stability of node and group uids.
+
+The project is mapped together with a small tree of definitions and calls
+whose names used to collide: external calls that only differ in where the
+dots are (foo_bar.baz() and foo.bar_baz()), a function redefined in the
+same file and a method sharing its name with a function. No uid may be
+shared by two different functions, and every spelling of the same root
+must give the same uids. The time to build the file groups, uids included,
+is reported.
+
+    python benchmarks/uids.py [project]
+"""
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from code2flow.engine import get_sources, map_it  # noqa: E402
+from code2flow.model import flatten  # noqa: E402
+
+COLLIDING = '''
+import foo
+import foo_bar
+
+
+def a():
+    foo_bar.baz()
+    foo.bar_baz()
+
+
+def b():
+    pass
+
+
+def b():
+    a()
+
+
+class C():
+    def a(self):
+        b()
+'''
+
+
+def uids(root):
+    """
+    :rtype: dict[str, set[tuple]]: uid -> the functions and groups that have it
+    """
+    file_groups, all_nodes, edges = map_it([root], get_sources([root]), True, True)
+    ret = {}
+    for node in all_nodes:
+        ret.setdefault(node.uid, set()).add(
+            ('node', node.name(), node.line_number, node.file_group().file_name
+             if node.file_group() else None))
+    for group in flatten(g.all_groups() for g in file_groups):
+        ret.setdefault(group.uid, set()).add(('group', group.label(), group.line_number))
+    return ret
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    project = sys.argv[1] if len(sys.argv) > 1 else os.path.join(
+        os.path.dirname(__file__), '..', 'projects', 'repo_agent')
+
+    work_dir = tempfile.mkdtemp(prefix='code2flow_uids_')
+    root = os.path.join(work_dir, 'project')
+    try:
+        shutil.copytree(project, root)
+        with open(os.path.join(root, 'colliding_names.py'), 'w') as f:
+            f.write(COLLIDING)
+
+        start = time.perf_counter()
+        found = uids(root)
+        elapsed = time.perf_counter() - start
+        shared = {uid: owners for uid, owners in found.items() if len(owners) > 1}
+        assert not shared, shared
+        external = sorted(name for owners in found.values() for kind, name, *_ in owners
+                          if name.startswith('EXTERNAL::foo'))
+        assert external == ['EXTERNAL::foo.bar_baz', 'EXTERNAL::foo_bar.baz'], external
+
+        cwd = os.getcwd()
+        os.chdir(work_dir)
+        try:
+            spellings = ['project', './project', root, 'project/../project']
+            assert all(set(uids(spelling)) == set(found) for spelling in spellings)
+        finally:
+            os.chdir(cwd)
+        print(f"{len(found)} uids, all unique and the same for {len(spellings)} spellings "
+              f"of the root, mapped in {elapsed:.2f} s")
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,7 +2,7 @@ import difflib
 import os
 import enum
 import shutil
-from .utils import generate_graph, get_call_graph
+from .utils import generate_graph, get_call_graph, get_function_content
 
 
 class FunctionChangeType(enum.Enum):
@@ -117,7 +117,7 @@ def _get_all_functions_from_file(file_path) -> dict:
     for _, entry in graph.items():
         name = entry['name']
         if 'EXTERNAL' not in name:
-            map[name] = entry['content']
+            map[name] = get_function_content('./tmp', entry)
     shutil.rmtree('./tmp')
     return map
 
@@ -0,0 +1,154 @@
+import hashlib
+import logging
+import os
+import pickle
+import sys
+import tempfile
+
+# Bump whenever the facts produced by make_file_group change shape or meaning.
+# Entries written by another version are never read.
+EXTRACTOR_VERSION = 2
+
+DEFAULT_CACHE_SIZE_LIMIT = 256 * 1024 * 1024
+CACHE_DIR_NAME = 'extraction_cache'
+ENTRY_SUFFIX = '.facts'
+
+
+def hash_content(content):
+    """
+    :param bytes content: contents of a source file
+    :rtype: str
+    """
+    return hashlib.sha256(content).hexdigest()
+
+
+class ExtractionCache():
+    """
+    On-disk cache of per-file extraction facts (see Group.to_facts).
+    Entries are keyed by the file path, a hash of the file contents, the
+    extractor version and the extraction options. A hit skips parsing the file.
+
+    The cache can be shared by several processes on one host:
+    entries are written to a temp file and renamed into place, so readers
+    only ever see complete entries. Eviction removes the least recently used
+    entries (by mtime, refreshed on every hit) once the cache is over its size limit.
+    """
+    def __init__(self, cache_dir, size_limit=DEFAULT_CACHE_SIZE_LIMIT, options=()):
+        """
+        :param str cache_dir:
+        :param int size_limit: size in bytes the cache is trimmed down to by evict()
+        :param tuple options: extraction options that change the facts
+        """
+        self.cache_dir = cache_dir
+        self.size_limit = size_limit
+        self.options = tuple(options)
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def __repr__(self):
+        return f"<ExtractionCache dir={self.cache_dir} hits={self.hits} misses={self.misses}>"
+
+    def key(self, source, content_hash=None):
+        """
+        The cache key for source. Facts must be stored under the key of the
+        exact contents they were extracted from, so pass the content_hash
+        of what was parsed. Without it the file is read and hashed now.
+
+        :param str source: file path
+        :param str content_hash: from hash_content
+        :rtype: str
+        """
+        if content_hash is None:
+            with open(source, 'rb') as f:
+                content_hash = hash_content(f.read())
+        key = repr((EXTRACTOR_VERSION, sys.version_info[:2], self.options,
+                    source, content_hash))
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ENTRY_SUFFIX)
+
+    def get(self, key):
+        """
+        Return the cached facts for key or None on a miss
+
+        :param str key:
+        :rtype: tuple|None
+        """
+        path = self._entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                facts = pickle.load(f)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception as ex:
+            logging.warning("Discarding unreadable cache entry %r. (%r)", path, ex)
+            self._remove(path)
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return facts
+
+    def put(self, key, facts):
+        """
+        Atomically store facts under key
+
+        :param str key:
+        :param tuple facts:
+        :rtype: None
+        """
+        path = self._entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(facts, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+
+    def evict(self):
+        """
+        Remove least recently used entries until the cache fits in size_limit.
+        Entries removed concurrently by another process are ignored.
+
+        :rtype: int: number of entries removed
+        """
+        entries = []
+        total = 0
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if not entry.name.endswith(ENTRY_SUFFIX):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        removed = 0
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.size_limit:
+                break
+            self._remove(path)
+            total -= size
+            removed += 1
+        return removed
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
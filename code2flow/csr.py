@@ -0,0 +1,258 @@
+import bisect
+import mmap
+import struct
+import sys
+from array import array
+
+# call_graph.bin layout, every integer a native uint32:
+#   header         magic, version, byte order mark, nodes, callee edges,
+#                  caller edges, strings
+#   file_ids       [nodes]           string id of the node's file name
+#   callee_offsets [nodes + 1]       CSR of the callees, in json order
+#   callee_ids     [callee edges]
+#   caller_offsets [nodes + 1]       CSR of the callers, in json order
+#   caller_ids     [caller edges]
+#   string_offsets [strings + 1]     byte offsets into the string blob
+#   string blob                      utf-8
+# Strings 0..nodes-1 are the node names, sorted by their utf-8 bytes so that
+# names can be looked up by binary search. Strings nodes..2*nodes-1 are the
+# uids, followed by the distinct file names.
+MAGIC = b'C2FCSR\x00\x00'
+VERSION = 1
+BYTE_ORDER_MARK = 0x01020304
+_HEADER = struct.Struct('=8s6I')
+
+
+def _csr(neighbours, ids):
+    """
+    :param list[list[str]] neighbours: names of the neighbours of every node
+    :param dict[str, int] ids: name -> node id
+    :rtype: (array, array): offsets and neighbour ids
+    """
+    offsets = array('I', [0])
+    targets = array('I')
+    for names in neighbours:
+        targets.extend([ids[name] for name in names])
+        offsets.append(len(targets))
+    return offsets, targets
+
+
+def write_csr(f, calls):
+    """
+    Write the topology of the call graph json (no function content)
+
+    :param file f: opened in binary mode
+    :param list[FunctionCall] calls: the calls of the json with callers and callees
+                                     filled in (see Processor.winners)
+    :rtype: None
+    """
+    encoded = [call.name.encode('utf-8') for call in calls]
+    order = sorted(range(len(calls)), key=encoded.__getitem__)
+    calls = [calls[i] for i in order]
+    strings = [encoded[i] for i in order]
+    ids = {call.name: i for i, call in enumerate(calls)}
+
+    strings += [call.uid.encode('utf-8') for call in calls]
+    file_ids = array('I')
+    files = {}  # file name -> string id
+    for call in calls:
+        file_id = files.get(call.file_name)
+        if file_id is None:
+            file_id = files[call.file_name] = len(strings)
+            strings.append(call.file_name.encode('utf-8'))
+        file_ids.append(file_id)
+
+    callee_offsets, callee_ids = _csr([call.callees for call in calls], ids)
+    caller_offsets, caller_ids = _csr([call.callers for call in calls], ids)
+    string_offsets = array('I', [0])
+    for string in strings:
+        string_offsets.append(string_offsets[-1] + len(string))
+
+    f.write(_HEADER.pack(MAGIC, VERSION, BYTE_ORDER_MARK, len(calls), len(callee_ids),
+                         len(caller_ids), len(strings)))
+    for section in (file_ids, callee_offsets, callee_ids, caller_offsets, caller_ids,
+                    string_offsets):
+        f.write(section.tobytes())
+    f.write(b''.join(strings))
+
+
+class _Names():
+    """
+    The node names as a sequence of utf-8 bytes, for bisect
+    """
+    __slots__ = ('graph',)
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __len__(self):
+        return len(self.graph)
+
+    def __getitem__(self, node_id):
+        return self.graph.string_bytes(node_id)
+
+
+class CSRGraph():
+    """
+    Read-only call graph over a memory-mapped call_graph.bin (see write_csr).
+    Nothing is deserialised up front: the CSR arrays are views straight into
+    the mapping and strings are only decoded when asked for.
+    Node ids are positions in name order.
+    """
+    def __init__(self, file_name):
+        """
+        :param str file_name:
+        """
+        with open(file_name, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < _HEADER.size:
+            self._mmap.close()
+            raise ValueError(f"{file_name!r} is not a code2flow binary call graph")
+        magic, version, byte_order_mark, num_nodes, num_callees, num_callers, num_strings = \
+            _HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION or byte_order_mark != BYTE_ORDER_MARK:
+            self._mmap.close()
+            raise ValueError(f"{file_name!r} is not a version {VERSION} code2flow binary "
+                             f"call graph for a {sys.byteorder}-endian machine")
+
+        self._view = memoryview(self._mmap)
+        self._views = [self._view]
+        position = _HEADER.size
+
+        def section(length):
+            nonlocal position
+            ret = self._view[position:position + 4 * length].cast('I')
+            self._views.append(ret)
+            position += 4 * length
+            return ret
+
+        self.file_ids = section(num_nodes)
+        self.callee_offsets = section(num_nodes + 1)
+        self.callee_ids = section(num_callees)
+        self.caller_offsets = section(num_nodes + 1)
+        self.caller_ids = section(num_callers)
+        self.string_offsets = section(num_strings + 1)
+        self._strings = self._view[position:]
+        self._views.append(self._strings)
+        self._names = _Names(self)
+
+    def __repr__(self):
+        return f"<CSRGraph nodes={len(self)} edges={len(self.callee_ids)}>"
+
+    def __len__(self):
+        return len(self.file_ids)
+
+    def __contains__(self, name):
+        try:
+            self.node_id(name)
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        return map(self.name, range(len(self)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Release the views and unmap the file
+        :rtype: None
+        """
+        while self._views:
+            self._views.pop().release()
+        self._mmap.close()
+
+    def string_bytes(self, string_id):
+        """
+        :param int string_id:
+        :rtype: bytes
+        """
+        return self._strings[self.string_offsets[string_id]:
+                             self.string_offsets[string_id + 1]].tobytes()
+
+    def string(self, string_id):
+        """
+        :param int string_id:
+        :rtype: str
+        """
+        return self.string_bytes(string_id).decode('utf-8')
+
+    def node_id(self, name):
+        """
+        Binary search over the sorted names
+        :param str name:
+        :rtype: int
+        """
+        key = name.encode('utf-8')
+        node_id = bisect.bisect_left(self._names, key)
+        if node_id == len(self) or self._names[node_id] != key:
+            raise KeyError(name)
+        return node_id
+
+    def name(self, node_id):
+        """
+        :param int node_id:
+        :rtype: str
+        """
+        return self.string(node_id)
+
+    def uid(self, node_id):
+        """
+        :param int node_id:
+        :rtype: str
+        """
+        return self.string(len(self) + node_id)
+
+    def file_name(self, node_id):
+        """
+        :param int node_id:
+        :rtype: str
+        """
+        return self.string(self.file_ids[node_id])
+
+    def callee_ids_of(self, node_id):
+        """
+        :param int node_id:
+        :rtype: memoryview: ids of the callees, without copying
+        """
+        return self.callee_ids[self.callee_offsets[node_id]:self.callee_offsets[node_id + 1]]
+
+    def caller_ids_of(self, node_id):
+        """
+        :param int node_id:
+        :rtype: memoryview: ids of the callers, without copying
+        """
+        return self.caller_ids[self.caller_offsets[node_id]:self.caller_offsets[node_id + 1]]
+
+    def callees(self, name):
+        """
+        :param str name:
+        :rtype: list[str]: same as the 'callees' of the json entry
+        """
+        return [self.name(i) for i in self.callee_ids_of(self.node_id(name))]
+
+    def callers(self, name):
+        """
+        :param str name:
+        :rtype: list[str]: same as the 'callers' of the json entry
+        """
+        return [self.name(i) for i in self.caller_ids_of(self.node_id(name))]
+
+    def entry(self, name):
+        """
+        :param str name:
+        :rtype: dict: the json entry without its content
+        """
+        node_id = self.node_id(name)
+        return {
+            'uid': self.uid(node_id),
+            'name': name,
+            'callers': [self.name(i) for i in self.caller_ids_of(node_id)],
+            'callees': [self.name(i) for i in self.callee_ids_of(node_id)],
+            'file_name': self.file_name(node_id),
+        }
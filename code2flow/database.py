@@ -0,0 +1,301 @@
+import collections
+import hashlib
+import os
+import sqlite3
+import urllib.request
+
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    file_name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS nodes (
+    id INTEGER PRIMARY KEY,
+    uid TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    file_id INTEGER NOT NULL REFERENCES files(id),
+    content TEXT,
+    content_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS nodes_name ON nodes(name);
+CREATE INDEX IF NOT EXISTS nodes_file ON nodes(file_id);
+CREATE TABLE IF NOT EXISTS edges (
+    caller_id INTEGER NOT NULL REFERENCES nodes(id),
+    callee_id INTEGER NOT NULL REFERENCES nodes(id),
+    calls INTEGER NOT NULL,
+    PRIMARY KEY (caller_id, callee_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS edges_callee ON edges(callee_id, caller_id);
+"""
+
+
+def _content_hash(content):
+    """
+    :param str|None content:
+    :rtype: str|None
+    """
+    if content is None:
+        return None
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+class GraphDatabase():
+    """
+    Call graph in a local SQLite database (call_graph.db) with one row per
+    file, function and caller -> callee pair, indexed for the queries below.
+
+    update() writes the graph of a run by upserting: only the rows that
+    differ from the previous run are inserted, updated or deleted, so
+    incremental runs touch a handful of rows. The database uses WAL so
+    readers in other processes are not blocked while it is updated.
+
+    Query-only users open it with readonly=True: the connection is read-only
+    and never writes, so it can be opened while an update is in progress.
+    Only a writable database creates the schema, on its first update().
+
+    Entries read back (entry, get_callers, get_callees) are the same as
+    those of call_graph.json.
+    """
+    def __init__(self, file_name, readonly=False):
+        """
+        :param str file_name:
+        :param bool readonly: Open for queries only. The database must exist
+        """
+        self.file_name = file_name
+        self.readonly = readonly
+        if readonly:
+            uri = 'file:' + urllib.request.pathname2url(os.path.abspath(file_name)) + '?mode=ro'
+            self.connection = sqlite3.connect(uri, uri=True)
+        else:
+            self.connection = sqlite3.connect(file_name)
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        if version not in ((SCHEMA_VERSION,) if readonly else (0, SCHEMA_VERSION)):
+            self.connection.close()
+            raise ValueError(f"{file_name!r} has schema version {version}, "
+                             f"expected {SCHEMA_VERSION}")
+
+    def _create_schema(self):
+        """
+        Switch to WAL and create the tables and indexes if they don't exist yet
+        :rtype: None
+        """
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        with self.connection:
+            self.connection.executescript(_SCHEMA)
+            self.connection.execute(f'PRAGMA user_version={SCHEMA_VERSION}')
+
+    def __repr__(self):
+        return f"<GraphDatabase {self.file_name}>"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def update(self, calls, include_content=True):
+        """
+        Make the database hold exactly the given graph, changing only the
+        rows that differ from what is stored.
+
+        :param list[FunctionCall] calls: the calls of the json with callers and callees
+                                         filled in (see Processor.winners)
+        :param bool include_content: Store the source of every function
+        :rtype: (int, int, int): nodes added, updated and removed
+        """
+        assert not self.readonly, "Can't update a database opened read-only"
+        db = self.connection
+        if db.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+            self._create_schema()
+        with db:
+            # Files
+            file_ids = dict(db.execute('SELECT file_name, id FROM files'))
+            new_files = list(dict.fromkeys(call.file_name for call in calls
+                                           if call.file_name not in file_ids))
+            db.executemany('INSERT INTO files (file_name) VALUES (?)',
+                           [(file_name,) for file_name in new_files])
+            if new_files:
+                file_ids = dict(db.execute('SELECT file_name, id FROM files'))
+
+            # Nodes
+            stored = {uid: (node_id, name, file_id, content_hash)
+                      for uid, node_id, name, file_id, content_hash
+                      in db.execute('SELECT uid, id, name, file_id, content_hash FROM nodes')}
+            uids = {call.uid for call in calls}
+            removed = [(value[0],) for uid, value in stored.items() if uid not in uids]
+            db.executemany('DELETE FROM edges WHERE caller_id = ?', removed)
+            db.executemany('DELETE FROM edges WHERE callee_id = ?', removed)
+            db.executemany('DELETE FROM nodes WHERE id = ?', removed)
+
+            added = updated = 0
+            for call in calls:
+                content = None
+                if include_content:
+                    content = call.content.read() if call.content else ''
+                content_hash = _content_hash(content)
+                file_id = file_ids[call.file_name]
+                old = stored.get(call.uid)
+                if old is None:
+                    db.execute('INSERT INTO nodes (uid, name, file_id, content, content_hash) '
+                               'VALUES (?, ?, ?, ?, ?)',
+                               (call.uid, call.name, file_id, content, content_hash))
+                    added += 1
+                elif old[1:] != (call.name, file_id, content_hash):
+                    db.execute('UPDATE nodes SET name = ?, file_id = ?, content = ?, '
+                               'content_hash = ? WHERE id = ?',
+                               (call.name, file_id, content, content_hash, old[0]))
+                    updated += 1
+
+            # Edges, keyed by node id. A callee called n times has calls = n
+            node_ids = dict(db.execute('SELECT uid, id FROM nodes'))
+            ids_by_name = {call.name: node_ids[call.uid] for call in calls}
+            edges = {}
+            for call in calls:
+                caller_id = ids_by_name[call.name]
+                for callee_id, count in collections.Counter(
+                        ids_by_name[name] for name in call.callees).items():
+                    edges[(caller_id, callee_id)] = count
+            stored_edges = {(caller_id, callee_id): count for caller_id, callee_id, count
+                            in db.execute('SELECT caller_id, callee_id, calls FROM edges')}
+            db.executemany('DELETE FROM edges WHERE caller_id = ? AND callee_id = ?',
+                           [edge for edge in stored_edges if edge not in edges])
+            db.executemany('INSERT INTO edges (caller_id, callee_id, calls) VALUES (?, ?, ?) '
+                           'ON CONFLICT (caller_id, callee_id) DO UPDATE SET calls = excluded.calls',
+                           [edge + (count,) for edge, count in edges.items()
+                            if stored_edges.get(edge) != count])
+
+            db.execute('DELETE FROM files WHERE id NOT IN (SELECT file_id FROM nodes)')
+        return added, updated, len(removed)
+
+    def _node_id(self, name):
+        """
+        :param str name:
+        :rtype: int
+        """
+        row = self.connection.execute('SELECT id FROM nodes WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            raise KeyError(name)
+        return row[0]
+
+    def get_callers(self, name):
+        """
+        :param str name:
+        :rtype: list[str]: same as the 'callers' of the json entry
+        """
+        return [caller for caller, in self.connection.execute(
+            'SELECT n.name FROM edges e JOIN nodes n ON n.id = e.caller_id '
+            'WHERE e.callee_id = ? ORDER BY n.name', (self._node_id(name),))]
+
+    def get_callees(self, name):
+        """
+        :param str name:
+        :rtype: list[str]: same as the 'callees' of the json entry,
+                           a callee called n times is listed n times
+        """
+        ret = []
+        for callee, calls in self.connection.execute(
+                'SELECT n.name, e.calls FROM edges e JOIN nodes n ON n.id = e.callee_id '
+                'WHERE e.caller_id = ? ORDER BY n.name', (self._node_id(name),)):
+            ret += [callee] * calls
+        return ret
+
+    def entry(self, name):
+        """
+        :param str name:
+        :rtype: dict: the json entry of the function
+        """
+        row = self.connection.execute(
+            'SELECT n.uid, n.content, f.file_name FROM nodes n JOIN files f ON f.id = n.file_id '
+            'WHERE n.name = ?', (name,)).fetchone()
+        if row is None:
+            raise KeyError(name)
+        uid, content, file_name = row
+        ret = {'uid': uid, 'name': name}
+        if content is not None:
+            ret['content'] = content
+        ret.update({
+            'callers': self.get_callers(name),
+            'callees': self.get_callees(name),
+            'file_name': file_name,
+        })
+        return ret
+
+    def names(self):
+        """
+        :rtype: list[str]: every function, in json order
+        """
+        return [name for name, in self.connection.execute('SELECT name FROM nodes ORDER BY name')]
+
+    def get_file_to_functions(self):
+        """
+        Same as utils.get_file_to_functions on the json graph
+        :rtype: dict[str, list[str]]
+        """
+        ret = {}
+        for file_name, name in self.connection.execute(
+                'SELECT f.file_name, n.name FROM nodes n JOIN files f ON f.id = n.file_id '
+                'ORDER BY n.name'):
+            ret.setdefault(file_name, []).append(name)
+        return ret
+
+    def get_parent_dependencies(self, matched_functions, file_path):
+        """
+        Same as utils.get_parent_dependencies on the json graph: the functions
+        that transitively call matched_functions, by file, outside of file_path.
+        Each step of the walk is an indexed lookup of the callers of one function.
+
+        :param list[str] matched_functions:
+        :param str file_path:
+        :rtype: dict[str, list[str]]
+        """
+        db = self.connection
+        parent_dependencies = collections.defaultdict(list)
+        visited = set()
+        queue = collections.deque(matched_functions)
+        while queue:
+            name = queue.popleft()
+            if name in visited:
+                continue
+            visited.add(name)
+            row = db.execute(
+                'SELECT n.id, f.file_name FROM nodes n JOIN files f ON f.id = n.file_id '
+                'WHERE n.name = ?', (name,)).fetchone()
+            if row is None:
+                raise KeyError(name)
+            node_id, file_name = row
+            if file_name != 'EXTERNAL' and file_name != file_path:
+                parent_dependencies[file_name].append(name)
+            for caller, in db.execute(
+                    'SELECT n.name FROM edges e JOIN nodes n ON n.id = e.caller_id '
+                    'WHERE e.callee_id = ? ORDER BY n.name', (node_id,)):
+                if caller not in visited:
+                    queue.append(caller)
+        return dict(parent_dependencies)
+
+    def expand_callees(self, names, depth=5):
+        """
+        Every function reachable from names through at most depth calls,
+        in one recursive query over the edges.
+
+        :param list[str] names:
+        :param int depth:
+        :rtype: dict[str, int]: function -> fewest calls needed to reach it, in json order
+        """
+        names = list(names)
+        query = f"""
+            WITH RECURSIVE reach(id, depth) AS (
+                SELECT id, 0 FROM nodes WHERE name IN ({','.join('?' * len(names))})
+                UNION
+                SELECT e.callee_id, r.depth + 1 FROM reach r
+                JOIN edges e ON e.caller_id = r.id
+                WHERE r.depth < ?
+            )
+            SELECT n.name, MIN(r.depth) FROM reach r JOIN nodes n ON n.id = r.id
+            GROUP BY n.id ORDER BY n.name
+        """
+        return dict(self.connection.execute(query, names + [depth]))
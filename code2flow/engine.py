@@ -1,16 +1,41 @@
 import collections
+import concurrent.futures
+import contextlib
+import fnmatch
+import hashlib
+import heapq
 import json
 import logging
+import math
+import multiprocessing
 import os
+import re
 import subprocess
 import time
+import uuid
 
 from ordered_set import OrderedSet
 
-from .processor import Processor
+try:
+    import orjson
+except ImportError:  # optional, only speeds up compact json output
+    orjson = None
+
+from .cache import ExtractionCache, CACHE_DIR_NAME, DEFAULT_CACHE_SIZE_LIMIT, hash_content
+from .csr import write_csr
+from .database import GraphDatabase
+from .graph import CallGraph
+from .index import DefinitionIndex, ImportIndex
+from .processor import CONTENT_MODE, Processor
 from .python import Python
 from .model import (TRUNK_COLOR, LEAF_COLOR, NODE_COLOR, GROUP_TYPE, OWNER_CONST, Call,
-                    Edge, Group, Node, Variable, is_installed, flatten)
+                    Edge, Group, Node, assign_unique_uids, is_installed, flatten)
+
+# Projects with fewer functions are linked in-process even when workers > 1
+MIN_PARALLEL_LINK_NODES = 1000
+
+# Read-only state that forked link workers inherit from the parent (see _link_all)
+_LINK_STATE = None
 
 LEGEND = """subgraph legend{
     rank = min;
@@ -57,49 +82,238 @@ def write_dot(outfile, nodes, edges, groups, hide_legend=False,
     outfile.write(content)
 
 
-def get_sources(raw_source_paths, language='py'):
+# Directories that never hold project sources. Virtualenvs are also
+# recognised by their pyvenv.cfg, whatever they are called.
+PRUNED_DIRS = {'.git', '.hg', '.svn', '__pycache__', 'node_modules', '.tox', '.nox',
+               '.venv', 'venv', '.mypy_cache', '.pytest_cache', '.ruff_cache', '.eggs'}
+
+
+def _gitignore_regex(pattern, anchored):
     """
-    Given a list of files and directories, return just files.
-    Filter out files that are not of Python language
+    Translate a gitignore pattern into a regex over '/' separated relative
+    paths. As in git, '*', '?' and '[...]' never match '/'. Only '**' as a
+    whole path segment spans directories. Unanchored patterns match at any depth.
+
+    :param str pattern: without the leading '!', leading '/' or trailing '/'
+    :param bool anchored: the pattern contained a '/'
+    :rtype: re.Pattern
+    """
+    parts = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '*' and pattern.startswith('**', i) \
+                and (i == 0 or pattern[i - 1] == '/') and (i + 2 == n or pattern[i + 2] == '/'):
+            if i + 2 == n:
+                parts.append('.*')                # trailing '/**': everything inside
+                i += 2
+            else:
+                parts.append('(?:[^/]*/)*')       # '**/': zero or more directories
+                i += 3
+            continue
+        if c == '*':
+            parts.append('[^/]*')
+            while i < n and pattern[i] == '*':
+                i += 1
+            continue
+        if c == '?':
+            parts.append('[^/]')
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            parts.append(re.escape(pattern[i]))
+        elif c == '[':
+            start = i + 1
+            negated = pattern[start:start + 1] in ('!', '^')
+            if negated:
+                start += 1
+            # a ']' right after the '[' (or '[!') is literal
+            end = pattern.find(']', start + 1)
+            if end == -1:
+                parts.append(re.escape(c))
+            else:
+                chars = ''.join('\\' + ch if ch in '\\[]^' else ch
+                                for ch in pattern[start:end])
+                parts.append('(?!/)[' + ('^' if negated else '') + chars + ']')
+                i = end
+        else:
+            parts.append(re.escape(c))
+        i += 1
+    regex = ''.join(parts)
+    if not anchored:
+        regex = '(?:[^/]*/)*' + regex
+    return re.compile(regex, re.DOTALL)
+
+
+def _read_gitignore(directory):
+    """
+    Parse the .gitignore in directory, if any, into (regex, negate, dir_only) rules
+
+    :param str directory:
+    :rtype: list[(re.Pattern, bool, bool)]
+    """
+    try:
+        with open(os.path.join(directory, '.gitignore'), encoding='utf-8', errors='replace') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return []
+    rules = []
+    for line in lines:
+        line = line.rstrip()
+        if not line or line.startswith('#'):
+            continue
+        negate = line.startswith('!')
+        if negate:
+            line = line[1:]
+        dir_only = line.endswith('/')
+        line = line.rstrip('/')
+        anchored = '/' in line
+        line = line.lstrip('/')
+        if line:
+            rules.append((_gitignore_regex(line, anchored), negate, dir_only))
+    return rules
+
+
+def _is_ignored(rel_path, is_dir, rule_sets):
+    """
+    Whether the last matching gitignore rule excludes rel_path. As in git,
+    the .gitignore files are applied from the outermost to the innermost,
+    so a '!' rule in a subdirectory can re-include what a parent ignores.
+
+    :param str rel_path: '/' separated path relative to the directory being walked
+    :param bool is_dir:
+    :param list rule_sets: (path of the .gitignore directory relative to the
+                           directory being walked, rules from _read_gitignore),
+                           outermost first
+    :rtype: bool
+    """
+    ignored = False
+    for base, rules in rule_sets:
+        path = rel_path[len(base) + 1:] if base else rel_path
+        for regex, negate, dir_only in rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.fullmatch(path):
+                ignored = not negate
+    return ignored
+
+
+def iter_sources(raw_source_paths, language='py', exclude_paths=None, max_file_size=None,
+                 use_gitignore=True, counts=None):
+    """
+    Lazily yield the source files in a list of files and directories.
+    Explicitly listed files are always yielded. Directories are walked with
+    os.scandir, pruning PRUNED_DIRS, virtualenvs and whatever .gitignore files
+    exclude. Paths matching exclude_paths and files larger than max_file_size
+    are skipped.
 
     :param list[str] raw_source_paths: file or directory paths
-    :rtype: (list, str)
+    :param str language: file extension
+    :param list[str] exclude_paths: glob patterns matched against the name and the
+                                    path relative to the directory being walked
+    :param int max_file_size: size in bytes above which files are skipped
+    :param bool use_gitignore:
+    :param collections.Counter counts: receives the 'skipped' and 'oversized' counts
+    :rtype: Iterator[str]
     """
+    exclude_paths = exclude_paths or []
+    counts = counts if counts is not None else collections.Counter()
+    seen = set()
+
+    def excluded(rel_path, name):
+        return any(fnmatch.fnmatchcase(rel_path, p) or fnmatch.fnmatchcase(name, p)
+                   for p in exclude_paths)
 
-    individual_files = []
     for source in sorted(raw_source_paths):
         if os.path.isfile(source):
-            individual_files.append((source, True))
+            if source not in seen:
+                seen.add(source)
+                yield source
             continue
-        for root, _, files in os.walk(source):
-            for f in files:
-                individual_files.append((os.path.join(root, f), False))
 
-    if not individual_files:
+        # Stack of (directory, path relative to source, [(rules base, rules)])
+        stack = [(source, '', [])]
+        while stack:
+            directory, rel_dir, rule_sets = stack.pop()
+            if use_gitignore:
+                rules = _read_gitignore(directory)
+                if rules:
+                    rule_sets = rule_sets + [(rel_dir, rules)]
+            try:
+                entries = sorted(os.scandir(directory), key=lambda e: e.name)
+            except OSError:
+                continue
+
+            subdirs = []
+            for entry in entries:
+                rel_path = f'{rel_dir}/{entry.name}' if rel_dir else entry.name
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if excluded(rel_path, entry.name) or _is_ignored(rel_path, is_dir, rule_sets):
+                    if not is_dir:
+                        counts['skipped'] += 1
+                    continue
+                if is_dir:
+                    if entry.name in PRUNED_DIRS or entry.is_symlink() \
+                       or os.path.exists(os.path.join(entry.path, 'pyvenv.cfg')):
+                        continue
+                    subdirs.append((entry.path, rel_path, rule_sets))
+                    continue
+                if not entry.name.endswith('.' + language):
+                    counts['skipped'] += 1
+                    continue
+                if max_file_size is not None and entry.stat().st_size > max_file_size:
+                    counts['oversized'] += 1
+                    continue
+                if entry.path not in seen:
+                    seen.add(entry.path)
+                    yield entry.path
+            stack += reversed(subdirs)
+
+
+def discover_sources(raw_source_paths, language='py', **kwargs):
+    """
+    iter_sources, logging what was found once discovery finishes.
+    Raises if nothing was found.
+
+    :param list[str] raw_source_paths: file or directory paths
+    :param str language: file extension
+    :param kwargs: passed to iter_sources
+    :rtype: Iterator[str]
+    """
+    counts = collections.Counter()
+    found = 0
+    for source in iter_sources(raw_source_paths, language, counts=counts, **kwargs):
+        found += 1
+        yield source
+
+    if not found and not counts['skipped'] and not counts['oversized']:
         raise AssertionError("No source files found from %r" %
                              raw_source_paths)
     # logging.info("Found %d files from sources argument.", len(individual_files))
 
-    skipped = 0
-    sources = OrderedSet()
-    for source, explicity_added in individual_files:
-        if explicity_added or source.endswith('.' + language):
-            sources.add(source)
-        else:
-            skipped += 1
-    
-    logging.info("Skipped %d non-Python files.", skipped)            
+    logging.info("Skipped %d non-Python files.", counts['skipped'])
+    if counts['oversized']:
+        logging.info("Skipped %d file(s) larger than the size limit.", counts['oversized'])
 
-    if not sources:
+    if not found:
         raise AssertionError("Could not find any source files given {raw_source_paths} "
                              "and language {language}.")
 
-    sources = sorted(list(sources))
-    logging.info("Processing %d source file(s)." % (len(sources)))
-    # for source in sources:
-    #     logging.info("  " + source)
+    logging.info("Processing %d source file(s)." % found)
+
+
+def get_sources(raw_source_paths, language='py', **kwargs):
+    """
+    Given a list of files and directories, return just files.
+    Filter out files that are not of Python language
 
-    return sources
+    :param list[str] raw_source_paths: file or directory paths
+    :param kwargs: passed to iter_sources
+    :rtype: (list, str)
+    """
+    return sorted(discover_sources(raw_source_paths, language, **kwargs))
 
 
 def make_file_group(tree, filename):
@@ -131,25 +345,181 @@ def make_file_group(tree, filename):
     for subgroup_tree in subgroup_trees:
         file_group.add_subgroup(language.make_class_group(
             subgroup_tree, parent=file_group))
+    assign_unique_uids(file_group)
     return file_group
 
 
-def _find_link_for_call(call: Call, node_a: Node, all_nodes, external: set[str], all_group_names: set[str], paths : set[str]):
+def _extract_file_group(source, content=None):
+    """
+    Parse a single file and build its file group.
+    Parse errors are returned rather than raised so the caller
+    can decide whether to skip them.
+
+    :param str source:
+    :param bytes content: the contents of source if already read
+    :rtype: (Group|None, Exception|None)
+    """
+    try:
+        tree = Python.get_tree(source, content)
+    except Exception as ex:
+        return None, ex
+    return make_file_group(tree, source), None
+
+
+def _extract_file(source, hashed=False):
+    """
+    Worker entry point for the parallel extraction stage.
+    Like _extract_file_group but the file group is reduced to its compact,
+    picklable facts. With hashed, the hash of the exact contents that were
+    parsed is returned too, to key the facts in the cache.
+
+    :param str source:
+    :param bool hashed:
+    :rtype: (tuple|None, Exception|None, str|None)
+    """
+    try:
+        with open(source, 'rb') as f:
+            content = f.read()
+    except Exception as ex:
+        return None, ex, None
+    file_group, ex = _extract_file_group(source, content)
+    return ((file_group.to_facts() if file_group else None), ex,
+            hash_content(content) if hashed else None)
+
+
+def make_file_groups(sources, skip_parse_errors, workers=1, cache=None):
+    """
+    Parse every source and build its file group.
+    With workers > 1, parsing and extraction happen in a process pool. Large files
+    are scheduled first to keep the pool balanced. If sources is an iterator
+    (see discover_sources), parsing overlaps discovery: only a couple of files per
+    worker are in flight, and whenever a worker frees up it gets the largest file
+    discovered so far. Results are turned into file groups as they complete, so
+    only the facts of the files in flight are held at once. With a cache, unchanged
+    files are rebuilt from their cached facts without being parsed. The file groups
+    are returned in the order of sources (sorted, for an iterator) so the output
+    matches the serial mode.
+
+    :param list[str]|Iterator[str] sources:
+    :param bool skip_parse_errors:
+    :param int workers: number of worker processes
+    :param ExtractionCache|None cache:
+    :rtype: list[Group]
+    """
+    file_groups = {}
+    keys = {}
+
+    def from_cache(source):
+        """
+        Facts are only ever stored under the hash of the contents they were
+        parsed from, so a file edited between hashing and parsing can't be
+        cached under the wrong key. On a miss, the contents read for the key
+        are returned to be parsed as they are.
+        :rtype: (bool, bytes|None)
+        """
+        if not cache:
+            return False, None
+        try:
+            with open(source, 'rb') as f:
+                content = f.read()
+        except OSError:
+            return False, None
+        keys[source] = cache.key(source, hash_content(content))
+        facts = cache.get(keys[source])
+        if facts is None:
+            return False, content
+        file_groups[source] = Group.from_facts(facts)
+        return True, None
+
+    def add(source, file_group, facts, ex):
+        if ex is not None:
+            if skip_parse_errors:
+                logging.warning(
+                    "Could not parse %r. (%r) Skipping...", source, ex)
+                return
+            raise ex
+        if cache and source in keys:
+            cache.put(keys[source], facts or file_group.to_facts())
+        file_groups[source] = file_group
+
+    # Files are handled one at a time and their ASTs and facts are released as soon
+    # as the file group is built. Peak memory is the model plus the files in flight.
+    if not workers or workers <= 1 or (isinstance(sources, list) and len(sources) <= 1):
+        sources = list(sources)
+        for source in sources:
+            hit, content = from_cache(source)
+            if not hit:
+                file_group, ex = _extract_file_group(source, content)
+                add(source, file_group, None, ex)
+    else:
+        discovered = []
+        pending = []  # heap of (-size, source) not submitted yet
+        in_flight = 2 * workers
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {}  # future -> source, only for files in flight
+
+            def submit():
+                source = heapq.heappop(pending)[1]
+                futures[executor.submit(_extract_file, source, cache is not None)] = source
+
+            def collect(block):
+                # Each result becomes its file group as soon as it is done, so only
+                # the facts of the files in flight are ever held at once
+                if block:
+                    concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in [future for future in futures if future.done()]:
+                    source = futures.pop(future)
+                    facts, ex, content_hash = future.result()
+                    if content_hash is not None:
+                        keys[source] = cache.key(source, content_hash)
+                    add(source, Group.from_facts(facts) if facts else None, facts, ex)
+
+            for source in sources:
+                discovered.append(source)
+                if not from_cache(source)[0]:
+                    try:
+                        size = os.path.getsize(source)
+                    except OSError:
+                        size = 0
+                    heapq.heappush(pending, (-size, source))
+                # A list is known up front, so all of it is submitted largest first
+                if not isinstance(sources, list):
+                    collect(block=False)
+                    while pending and len(futures) < in_flight:
+                        submit()
+            while pending or futures:
+                while pending and len(futures) < in_flight:
+                    submit()
+                collect(block=True)
+            if not isinstance(sources, list):
+                sources = sorted(discovered)
+
+    if cache:
+        logging.info("Extraction cache: %d hit(s), %d miss(es).", cache.hits, cache.misses)
+        cache.evict()
+    return [file_groups[source] for source in sources if source in file_groups]
+
+
+def _find_link_for_call(call: Call, node_a: Node, index: DefinitionIndex, external: set[str], all_group_names: set[str], paths : set[str]):
     """
     Given a call that happened on a node (node_a), return the node
     that the call links to and the call itself if >1 node matched.
 
     :param call Call:
     :param node_a Node:
-    :param all_nodes list[Node]:
+    :param index DefinitionIndex: candidate definitions by token
 
     :returns: The node it links to and the call if >1 node matched.
     :rtype: (Node|None, Call|None)
     """
 
-    all_vars = node_a.get_variables(call.line_number)
+    if call.is_attr():
+        # namespace variables match on the first part of the owner
+        tokens = (call.owner_token, call.owner_token.split('.')[0])
+    else:
+        tokens = (call.token,)
 
-    for var in all_vars:
+    for var in node_a.get_variables_named(tokens, call.line_number):
         var_match = call.matches_variable(var)
         if var_match:
             # Unknown modules (e.g. third party) we don't want to match)
@@ -167,13 +537,9 @@ def _find_link_for_call(call: Call, node_a: Node, all_nodes, external: set[str],
         # Attempt to check if internal
         is_external = True
         normalized = method_name.replace(f'.{call.token}', '')
-        if normalized in paths:
-            functions = paths[normalized]
-            for f in functions:
-                if f'{normalized}.{call.token}' == f'{normalized}.{f}':
-                    is_external = False
-                    break
-            
+        if normalized in paths and call.token in paths[normalized]:
+            is_external = False
+
         if is_external:
             external.add(method_name)
         
@@ -183,23 +549,10 @@ def _find_link_for_call(call: Call, node_a: Node, all_nodes, external: set[str],
             method_name = f'{resolved}.{call.token}'
             external.add(method_name)
 
-    possible_nodes = []
     if method_name and method_name in external:
-        possible_nodes.append(Node.external_node(method_name))
-    elif call.is_attr():
-        for node in all_nodes:
-            # checking node.parent != node_a.file_group() prevents self linkage in cases like
-            # function a() {b = Obj(); b.a()}
-            if call.token == node.token and node.parent != node_a.file_group():
-                possible_nodes.append(node)
+        possible_nodes = [Node.external_node(method_name)]
     else:
-        for node in all_nodes:
-            if call.token == node.token \
-               and isinstance(node.parent, Group)  \
-               and node.parent.group_type == GROUP_TYPE.FILE:
-                possible_nodes.append(node)
-            elif call.token == node.parent.token and node.is_constructor:
-                possible_nodes.append(node)
+        possible_nodes = index.candidates(call, node_a)
 
     if len(possible_nodes) == 1:
         return possible_nodes[0], None
@@ -211,27 +564,21 @@ def _find_link_for_call(call: Call, node_a: Node, all_nodes, external: set[str],
 def _resolve_module_import(node, call):
     while node.group_type != GROUP_TYPE.FILE:
         node = node.parent
-    for variable in node.get_variables():
-        if variable.token == call.owner_token:
-            return variable.points_to
-    return None
+    return node.resolve_name(call.owner_token)
 
 
 def _resolve_module_import_(node, call):
     while node.group_type != GROUP_TYPE.FILE:
         node = node.parent
-    for variable in node.get_variables():
-        if variable.token == call.token:
-            return variable.points_to
-    return None
+    return node.resolve_name(call.token)
 
-def _find_links(node_a, all_nodes, external, all_group_names, paths):
+def _find_links(node_a, index, external, all_group_names, paths):
     """
     Iterate through the calls on node_a to find everything the node links to.
     This will return a list of tuples of nodes and calls that were ambiguous.
 
     :param Node node_a:
-    :param list[Node] all_nodes:
+    :param DefinitionIndex index:
     :param BaseLanguage language:
     :rtype: list[(Node, Call)]
     """
@@ -239,13 +586,201 @@ def _find_links(node_a, all_nodes, external, all_group_names, paths):
     links = []
     for call in node_a.calls:
         lfc = _find_link_for_call(
-            call, node_a, all_nodes, external, all_group_names, paths)
+            call, node_a, index, external, all_group_names, paths)
         assert not isinstance(lfc, Group)
         links.append(lfc)
     return list(filter(None, links))
 
 
-def map_it(root_path, sources, no_trimming, skip_parse_errors):
+class _ExternalTracker():
+    """
+    Stand-in for the `external` set of map_it step 6.
+    Whether a method name is external depends on the calls that came before
+    it in node order. This records, per node, the names added and the outcome
+    of every membership test so unchanged nodes can be reused safely.
+    """
+    def __init__(self, first_added):
+        """
+        :param dict[str, int] first_added: method name -> position of the first node adding it
+        """
+        self.first_added = first_added
+        self.position = None
+        self.added = []
+        self.checked = {}
+
+    def start(self, position):
+        self.position = position
+        self.added = []
+        self.checked = {}
+
+    def add(self, method_name):
+        self.added.append(method_name)
+        if self.first_added.get(method_name, math.inf) > self.position:
+            self.first_added[method_name] = self.position
+
+    def __contains__(self, method_name):
+        if method_name in self.added:
+            return True
+        ret = self.first_added.get(method_name, math.inf) < self.position
+        self.checked[method_name] = ret
+        return ret
+
+
+def _link_range(start, stop):
+    """
+    Link worker. Find the links of all_nodes[start:stop] using the state
+    inherited from the parent process. Links come back compactly: nodes as
+    their position in all_nodes (external nodes as their name) and ambiguous
+    calls as their position in node_a.calls.
+
+    :param int start:
+    :param int stop:
+    :rtype: list[(list[(int|str|None, int|None)], list[str], dict[str, bool])]
+    """
+    all_nodes, positions, index, all_group_names, paths = _LINK_STATE
+    external = _ExternalTracker({})
+    ret = []
+    for position in range(start, stop):
+        node_a = all_nodes[position]
+        external.start(position)
+        links = []
+        for node_b, bad_call in _find_links(node_a, index, external, all_group_names, paths):
+            if node_b is not None:
+                node_b = positions[node_b] if node_b.parent else node_b.token
+            if bad_call is not None:
+                bad_call = next(i for i, c in enumerate(node_a.calls) if c is bad_call)
+            links.append((node_b, bad_call))
+        ret.append((links, external.added, external.checked))
+    return ret
+
+
+def _link_all(all_nodes, index, all_group_names, paths, workers=1):
+    """
+    Find the links of every node (map_it step 6) in node order.
+
+    With workers > 1 on a large enough project, ranges of nodes are linked in
+    forked processes that share the read-only indexes copy-on-write.
+    Whether a method name is external depends on the calls before it, and a
+    worker only sees the names added in its own range. So the few nodes whose
+    external checks come out differently once all ranges are merged are
+    linked again here. The result is the same as linking serially.
+
+    :param list[Node] all_nodes:
+    :param DefinitionIndex index:
+    :param set[str] all_group_names:
+    :param dict paths: see _get_paths
+    :param int workers:
+    :rtype: list[list[(Node|None, Call|None)]]
+    """
+    global _LINK_STATE
+    if (not workers or workers <= 1 or len(all_nodes) < MIN_PARALLEL_LINK_NODES
+            or 'fork' not in multiprocessing.get_all_start_methods()):
+        external = OrderedSet()
+        return [_find_links(node_a, index, external, all_group_names, paths)
+                for node_a in all_nodes]
+
+    positions = {node: i for i, node in enumerate(all_nodes)}
+    chunk_size = -(-len(all_nodes) // (workers * 4))
+    _LINK_STATE = (all_nodes, positions, index, all_group_names, paths)
+    try:
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context('fork')) as executor:
+            futures = [executor.submit(_link_range, start, min(start + chunk_size, len(all_nodes)))
+                       for start in range(0, len(all_nodes), chunk_size)]
+            results = flatten(future.result() for future in futures)
+    finally:
+        _LINK_STATE = None
+
+    first_added = {}
+    for position, (_, added, _) in enumerate(results):
+        for method_name in added:
+            first_added.setdefault(method_name, position)
+
+    external = _ExternalTracker(first_added)
+    ret = []
+    for position, (node_a, (links, _, checked)) in enumerate(zip(all_nodes, results)):
+        if any((first_added.get(m, math.inf) < position) != was_external
+               for m, was_external in checked.items()):
+            external.start(position)
+            ret.append(_find_links(node_a, index, external, all_group_names, paths))
+            continue
+        ret.append([(all_nodes[node_b] if isinstance(node_b, int)
+                     else Node.external_node(node_b) if node_b is not None else None,
+                     node_a.calls[bad_call] if bad_call is not None else None)
+                    for node_b, bad_call in links])
+    return ret
+
+
+def _resolve_inherits(all_subgroups, subgroups):
+    """
+    Point the bases of each of subgroups to the groups named like what they
+    inherit from. Inherited methods are looked up through Group.get_method.
+
+    :param list[Group] all_subgroups: every group in the project
+    :param list[Group] subgroups: the groups to process
+    :rtype: None
+    """
+    groups_by_token = collections.defaultdict(list)
+    for subgroup in all_subgroups:
+        if subgroup.token in groups_by_token:
+            logging.warning("Duplicate group name %r. Naming collision possible.",
+                            subgroup.token)
+        groups_by_token[subgroup.token].append(subgroup)
+
+    for subgroup in subgroups:
+        subgroup.bases = flatten(groups_by_token.get(g, []) for g in subgroup.inherits)
+    for subgroup in all_subgroups:
+        subgroup.clear_method_cache()
+
+
+def _log_bad_calls(bad_calls):
+    """
+    Loudly complain about calls that linked to more than one function
+
+    :param list[Call] bad_calls:
+    :rtype: None
+    """
+    bad_calls_strings = OrderedSet()
+    for bad_call in bad_calls:
+        bad_calls_strings.add(bad_call.to_string())
+    bad_calls_strings = list(bad_calls_strings)
+    if bad_calls_strings:
+        logging.info("Skipped processing these calls because the algorithm "
+                     "linked them to multiple function definitions: %r." % bad_calls_strings)
+
+
+def _trim_orphans(file_groups, graph):
+    """
+    Remove nodes that didn't connect to anything and the groups left empty.
+
+    :param list[Group] file_groups:
+    :param CallGraph graph:
+    :rtype: (list[Group], list[Node])
+    """
+    nodes_with_edges = graph.connected_nodes()
+    connected = set(nodes_with_edges)
+
+    def prune(group):
+        # Rebuild the children of every group once, bottom up.
+        # Returns whether anything is left in the group
+        group.nodes = [n for n in group.nodes if n in connected]
+        group.subgroups = [g for g in group.subgroups if prune(g)]
+        return bool(group.nodes or group.subgroups)
+
+    file_groups = [g for g in file_groups if prune(g)]
+    all_nodes = nodes_with_edges
+
+    if not all_nodes:
+        logging.warning("No functions found! Most likely, your file(s) do not have "
+                        "functions that call each other. Note that to generate a flowchart, "
+                        "you need to have both the function calls and the function "
+                        "definitions. Or, you might be excluding too many "
+                        "with --exclude-* / --include-* / --target-function arguments. ")
+        logging.warning("Code2flow will generate an empty output file.")
+    return file_groups, all_nodes
+
+
+def map_it(root_path, sources, no_trimming, skip_parse_errors, workers=1, cache=None):
     '''
     Given a language implementation and a list of filenames, do these things:
     1. Read/parse source ASTs
@@ -257,6 +792,7 @@ def map_it(root_path, sources, no_trimming, skip_parse_errors):
     7. Loudly complain about duplicate edges that were skipped
     8. Trim nodes that didn't connect to anything
 
+    :param str|list[str] root_path: the root (or roots) the sources were found in
     :param list[str] sources:
     :param str extension:
     :param bool no_trimming:
@@ -266,51 +802,28 @@ def map_it(root_path, sources, no_trimming, skip_parse_errors):
     :param list include_only_functions:
     :param bool skip_parse_errors:
     :param LanguageParams lang_params:
+    :param int workers: number of processes used for steps 1, 2 and 6
+    :param ExtractionCache cache: per-file cache for steps 1 and 2
 
     '''
-    # 1. Read/parse source ASTs (List of (source : str, ast : Module) tuples)
-    file_ast_trees = []
-    for source in sources:
-        try:
-            file_ast_trees.append((source, Python.get_tree(source)))
-        except Exception as ex:
-            if skip_parse_errors:
-                logging.warning(
-                    "Could not parse %r. (%r) Skipping...", source, ex)
-            else:
-                raise ex
-
+    # 1. Read/parse source ASTs and
     # 2. Find all groups (classes/modules) and nodes (functions) (a lot happens here)
-    file_groups = []
-    for source, file_ast_tree in file_ast_trees:
-        file_group = make_file_group(file_ast_tree, source)
-        file_groups.append(file_group)
+    file_groups = make_file_groups(sources, skip_parse_errors, workers, cache)
 
     # 3. Consolidate structures
     all_subgroups = flatten(g.all_groups()
                             for g in file_groups)  # All modules / classes
     all_nodes = flatten(g.all_nodes() for g in file_groups)  # All functions
-
-    nodes_by_subgroup_token = collections.defaultdict(list)
-    for subgroup in all_subgroups:
-        if subgroup.token in nodes_by_subgroup_token:
-            logging.warning("Duplicate group name %r. Naming collision possible.",
-                            subgroup.token)
-        nodes_by_subgroup_token[subgroup.token] += subgroup.nodes
-
-    for group in file_groups:
-        for subgroup in group.all_groups():
-            subgroup.inherits = [nodes_by_subgroup_token.get(
-                g) for g in subgroup.inherits]
-            subgroup.inherits = list(filter(None, subgroup.inherits))
-            for inherit_nodes in subgroup.inherits:
-                for node in subgroup.nodes:
-                    node.variables += [Variable(n.token, n, n.line_number)
-                                       for n in inherit_nodes]
+    _resolve_inherits(all_subgroups, all_subgroups)
 
     # 4. Attempt to resolve the variables (point them to a node or group)
+    imports = ImportIndex(file_groups)
+    for node in all_nodes:
+        node.resolve_variables(imports)
     for node in all_nodes:
-        node.resolve_variables(file_groups)
+        node.build_scope()
+    for group in all_subgroups:
+        group.build_scope()
 
     nodes = sorted(n.token_with_ownership() for n in all_nodes)
     all_calls = list(set(c.to_string()
@@ -326,68 +839,262 @@ def map_it(root_path, sources, no_trimming, skip_parse_errors):
 
     # 5. Find external calls (calls to functions that are not in the source code)
     all_group_names = OrderedSet([g.token for g in all_subgroups])
-    external = OrderedSet()
 
     # 6. Find all calls between all nodes
-    paths = __get_paths(root_path, all_nodes)    
+    paths = _get_paths(root_path, file_groups)
+    index = DefinitionIndex(all_nodes)
     bad_calls = []
-    edges = []
-    for node_a in list(all_nodes):
-        links = _find_links(node_a, all_nodes, external, all_group_names, paths)
+    graph = CallGraph(all_nodes)
+    all_links = _link_all(all_nodes, index, all_group_names, paths, workers)
+    for node_a, links in zip(all_nodes, all_links):
         for node_b, bad_call in links:
             if bad_call:
                 bad_calls.append(bad_call)
             if not node_b:
                 continue
-            edges.append(Edge(node_a, node_b))
+            graph.add_edge(node_a, node_b)
+    graph.flag_leaves_and_trunks()
+    edges = graph.edges()
     # logging.info("Found external calls %r" % sorted(external))
 
     # 7. Loudly complain about duplicate edges that were skipped
-    bad_calls_strings = OrderedSet()
-    for bad_call in bad_calls:
-        bad_calls_strings.add(bad_call.to_string())
-    bad_calls_strings = list(bad_calls_strings)
-    if bad_calls_strings:
-        logging.info("Skipped processing these calls because the algorithm "
-                     "linked them to multiple function definitions: %r." % bad_calls_strings)
+    _log_bad_calls(bad_calls)
 
     if no_trimming:
-        return file_groups, all_nodes, edges
+        return file_groups, list(graph.nodes), edges
 
     # 8. Trim nodes that didn't connect to anything
-    nodes_with_edges = OrderedSet()
-    for edge in edges:
-        nodes_with_edges.add(edge.node0)
-        nodes_with_edges.add(edge.node1)
+    file_groups, all_nodes = _trim_orphans(file_groups, graph)
+    return file_groups, all_nodes, edges
 
-    for node in all_nodes:
-        if node not in nodes_with_edges:
-            node.remove_from_parent()
+def _json_encoder(compact):
+    """
+    Encoder for one call graph entry.
+    Indented output matches json.dump(indent=4) of the whole graph. Compact
+    output has no whitespace and uses orjson when it is installed.
 
-    for file_group in file_groups:
-        for group in file_group.all_groups():
-            if not group.all_nodes():
-                group.remove_from_parent()
+    :param bool compact:
+    :rtype: function: object -> str
+    """
+    if not compact:
+        encoder = json.JSONEncoder(indent=4)
+        encode_str = json.encoder.encode_basestring_ascii
+
+        def encode_indented(obj):
+            # Entries sit one level deep in the graph object. json escapes
+            # newlines inside strings, so every newline here is indentation.
+            return encoder.encode(obj).replace('\n', '\n    ')
+
+        def encode_scalar(value):
+            if isinstance(value, str):
+                return encode_str(value)
+            if value is None:
+                return 'null'
+            if type(value) is int:
+                return int.__repr__(value)
+            return None
+
+        def encode(obj):
+            # json.JSONEncoder only uses its C encoder without indentation, so
+            # the entry layout (scalars and flat lists of scalars) is written
+            # here with the C string escaping. Anything else goes through json.
+            fields = []
+            for key, value in obj.items():
+                encoded = encode_scalar(value)
+                if encoded is None:
+                    if type(value) is not list:
+                        return encode_indented(obj)
+                    items = [encode_scalar(item) for item in value]
+                    if None in items:
+                        return encode_indented(obj)
+                    encoded = ('[\n            ' + ',\n            '.join(items) + '\n        ]'
+                               if items else '[]')
+                fields.append(encode_str(key) + ': ' + encoded)
+            if not fields:
+                return '{}'
+            return '{\n        ' + ',\n        '.join(fields) + '\n    }'
+        return encode
+
+    encoder = json.JSONEncoder(separators=(',', ':'))
+    if orjson is None:
+        return encoder.encode
+
+    def encode(obj):
+        try:
+            return orjson.dumps(obj).decode('utf-8')
+        except orjson.JSONEncodeError:
+            # e.g. lone surrogates, which json escapes but orjson rejects
+            return encoder.encode(obj)
+    return encode
 
-    file_groups = [g for g in file_groups if g.all_nodes()]
-    all_nodes = list(nodes_with_edges)
 
-    if not all_nodes:
-        logging.warning("No functions found! Most likely, your file(s) do not have "
-                        "functions that call each other. Note that to generate a flowchart, "
-                        "you need to have both the function calls and the function "
-                        "definitions. Or, you might be excluding too many "
-                        "with --exclude-* / --include-* / --target-function arguments. ")
-        logging.warning("Code2flow will generate an empty output file.")
+@contextlib.contextmanager
+def _atomic_open(file_name, mode='w'):
+    """
+    Write to a temp file and rename it into place on success so that readers
+    always see either the previous or the new file, never a partial one.
 
-    return file_groups, all_nodes, edges
+    :param str file_name:
+    :param str mode: 'w' or 'wb'
+    :rtype: file
+    """
+    tmp_file_name = f'{file_name}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_file_name, mode, encoding=None if 'b' in mode else 'utf-8') as f:
+            yield f
+        os.replace(tmp_file_name, file_name)
+    except BaseException:
+        if os.path.exists(tmp_file_name):
+            os.remove(tmp_file_name)
+        raise
+
+
+def _content_to_sidecar(entries, f, sidecar_name):
+    """
+    Move the content of every entry into the sidecar file f and leave a
+    [sidecar file name, byte offset, length] reference to it in the entry.
+    The sidecar is content addressed: identical function bodies are stored once.
+
+    :param Iterable[(str, dict)] entries:
+    :param file f: opened in binary mode
+    :param str sidecar_name: file name of f, relative to the output dir
+    :rtype: Iterator[(str, dict)]
+    """
+    offsets = {}  # sha256 of the content -> (offset, length)
+    end = 0
+    for name, entry in entries:
+        if 'content' in entry:
+            data = entry.pop('content').encode('utf-8')
+            digest = hashlib.sha256(data).digest()
+            ref = offsets.get(digest)
+            if ref is None:
+                f.write(data)
+                ref = offsets[digest] = (end, len(data))
+                end += len(data)
+            entry['content_ref'] = [sidecar_name, *ref]
+        yield name, entry
+
+
+def _write_json_entries(f, entries, compact):
+    """
+    :param file f:
+    :param Iterable[(str, dict)] entries:
+    :param bool compact:
+    :rtype: int: number of entries written
+    """
+    encode = _json_encoder(compact)
+    if compact:
+        first, separator, end = '{', ',', '}'
+    else:
+        first, separator, end = '{\n    ', ',\n    ', '\n}'
+    key_separator = ':' if compact else ': '
+
+    count = 0
+    for name, entry in entries:
+        f.write(separator if count else first)
+        f.write(json.dumps(name))
+        f.write(key_separator)
+        f.write(encode(entry))
+        count += 1
+    f.write(end if count else '{}')
+    return count
+
+
+def _remove_stale_sidecars(output_dir, keep=None):
+    """
+    :param str output_dir:
+    :param str keep: file name of the sidecar the current json refers to
+    :rtype: None
+    """
+    for file_name in os.listdir(output_dir):
+        if file_name.startswith('call_graph.') and file_name.endswith('.content') \
+                and file_name != keep:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(output_dir, file_name))
 
-def _write_call_graph(output_dir, content):
+
+def _write_call_graph(output_dir, entries, compact=False, sidecar=False):
+    """
+    Stream the call graph to output_dir/call_graph.json one entry at a time,
+    so only a single function's content is in memory at once.
+
+    :param str output_dir:
+    :param Iterable[(str, dict)] entries: name -> entry (see Processor.entries)
+    :param bool compact: Write without indentation or whitespace
+    :param bool sidecar: Move function content to a call_graph.<id>.content file
+    :rtype: None
+    """
     json_file_name = os.path.join(output_dir, 'call_graph.json')
-    with open(json_file_name, 'w') as f:
-        json.dump(content, f, indent=4)
+    sidecar_name = None
+    with _atomic_open(json_file_name) as f:
+        if sidecar:
+            # Every run writes a new, uniquely named sidecar and the json names
+            # it, so the json renamed into place never refers to another run's
+            # content. Older sidecars are removed once the json is replaced.
+            sidecar_name = f'call_graph.{uuid.uuid4().hex[:16]}.content'
+            with _atomic_open(os.path.join(output_dir, sidecar_name), 'wb') as content_file:
+                count = _write_json_entries(
+                    f, _content_to_sidecar(entries, content_file, sidecar_name), compact)
+        else:
+            count = _write_json_entries(f, entries, compact)
+    _remove_stale_sidecars(output_dir, keep=sidecar_name)
     logging.info("Call Graph with %d nodes stored in: %r",
-                 len(content), json_file_name)
+                 count, json_file_name)
+
+
+def write_outputs(output_dir, file_groups, all_nodes, edges, generate_json=True,
+                  generate_image=True, hide_legend=True, no_grouping=False,
+                  include_content=True, compact_json=False,
+                  content_mode=CONTENT_MODE.INLINE, generate_binary=False,
+                  generate_database=False):
+    """
+    Write call_graph.json, call_graph.bin, call_graph.db and/or graph.png for a mapped graph
+
+    :param str output_dir:
+    :param list[Group] file_groups:
+    :param list[Node] all_nodes:
+    :param list[Edge] edges:
+    :param bool generate_json:
+    :param bool generate_image:
+    :param bool hide_legend:
+    :param bool no_grouping:
+    :param bool include_content: Include the source of every function in the json
+    :param bool compact_json: Write the json without indentation
+    :param str content_mode: Where the json puts function content (see CONTENT_MODE)
+    :param bool generate_binary: Also write the topology to call_graph.bin (see csr.py)
+    :param bool generate_database: Also upsert the graph into call_graph.db (see database.py)
+    :rtype: None
+    """
+    # Remove duplicate nodes (external calls, etc.)
+    unique = {}
+    for node in all_nodes:
+        unique[node.uid] = node
+    all_nodes = list(unique.values())
+
+    # Sort for deterministic output
+    all_nodes.sort(key=Node.name)
+    file_groups = sorted(file_groups, key=Group.label)
+    edges = sorted(edges, key=Edge.sort_key)
+
+    processor = Processor(all_nodes, edges, include_content=include_content,
+                          content_mode=content_mode)
+    if generate_json:
+        _write_call_graph(output_dir, processor.entries(), compact=compact_json,
+                          sidecar=content_mode == CONTENT_MODE.SIDECAR)
+    if generate_binary:
+        with _atomic_open(os.path.join(output_dir, 'call_graph.bin'), 'wb') as f:
+            write_csr(f, processor.winners)
+    if generate_database:
+        db_file_name = os.path.join(output_dir, 'call_graph.db')
+        with GraphDatabase(db_file_name) as db:
+            added, updated, removed = db.update(processor.winners, include_content)
+        logging.info("Call Graph database %r: %d nodes added, %d updated, %d removed",
+                     db_file_name, added, updated, removed)
+
+    if generate_image:
+        _generate_img(output_dir, all_nodes, edges,
+                      file_groups, hide_legend, no_grouping)
+
 
 def _generate_img(output_dir, all_nodes, edges, file_groups, hide_legend, no_grouping):
     if not is_installed('dot') and not is_installed('dot.exe'):
@@ -441,21 +1148,39 @@ def _generate_graphviz(output_file, extension, final_img_filename):
             logging.warning("*** Graphviz returned non-zero exit code! "
                             "Try running %r for more detail ***", ' '.join(command + ['-v', '-O']))
 
-def __get_paths(root_path, all_nodes):
-    # Turn 'C:\\Coding\\simple-users\\api\\samples\\a.py' into api.samples.a
+def _get_paths(root_path, file_groups):
+    """
+    Index every file by its dotted module path.
+
+    :param str|list[str] root_path: the root (or roots) the sources were found in
+    :param list[Group] file_groups:
+    :rtype: dict[str, OrderedSet[str]]: module path -> names of the functions defined in it
+    """
     paths = {}
-    parents = [node.parent for node in all_nodes if node.parent is not None]
-    for p in parents:
-        if p.group_type == GROUP_TYPE.FILE and p.parent is None:
-            path = p.file_name
-            path = path.replace(root_path, '')
-            path = path.replace('.py', '')
-            split = path.split(os.sep)[1:]
-            path = '.'.join(split)
-            paths[path] = __get_all_calls(p)
+    for file_group in file_groups:
+        paths[_module_path(root_path, file_group.file_name)] = _get_all_calls(file_group)
     return paths
 
-def __get_all_calls(node):
+def _module_path(root_path, file_name):
+    """
+    Turn 'C:\\Coding\\simple-users\\api\\samples\\a.py' into api.samples.a
+    relative to the innermost root that contains the file.
+
+    :param str|list[str] root_path: the root (or roots) the sources were found in
+    :param str file_name:
+    :rtype: str
+    """
+    root_paths = [root_path] if isinstance(root_path, str) else root_path
+    containing = [root for root in root_paths
+                  if file_name == root or file_name.startswith(root.rstrip(os.sep) + os.sep)]
+    path = file_name
+    if containing:
+        path = path[len(max(containing, key=len)):]
+    if path.endswith('.py'):
+        path = path[:-len('.py')]
+    return '.'.join(part for part in path.split(os.sep) if part)
+
+def _get_all_calls(node):
     calls = OrderedSet()
     # Get all calls from all nodes and subgroups
     for n in node.all_nodes():
@@ -467,7 +1192,12 @@ def code2flow(raw_source_paths, output_dir, hide_legend=True,
               exclude_namespaces=None, exclude_functions=None,
               include_only_namespaces=None, include_only_functions=None,
               no_grouping=False, no_trimming=False, skip_parse_errors=False,
-              generate_json=True, generate_image=True, level=logging.INFO, silent=False):
+              generate_json=True, generate_image=True, level=logging.INFO, silent=False,
+              workers=1, use_cache=False, cache_dir=None,
+              cache_size_limit=DEFAULT_CACHE_SIZE_LIMIT, exclude_paths=None,
+              max_file_size=None, use_gitignore=True, include_content=True,
+              compact_json=False, content_mode=CONTENT_MODE.INLINE, generate_binary=False,
+              generate_database=False):
     """
     Top-level function. Generate a diagram based on source code.
     Can generate either a dotfile or an image.
@@ -484,6 +1214,22 @@ def code2flow(raw_source_paths, output_dir, hide_legend=True,
     :param bool skip_parse_errors: If a language parser fails to parse a file, skip it
     :param lang_params LanguageParams: Object to store lang-specific params
     :param int level: logging level
+    :param int workers: number of processes used to parse files and link calls. None uses all CPUs
+    :param bool use_cache: Reuse what was extracted from unchanged files in earlier runs
+    :param str cache_dir: Where the extraction cache lives. Defaults to output_dir/extraction_cache
+    :param int cache_size_limit: Size in bytes the extraction cache is trimmed down to
+    :param list exclude_paths: Glob patterns of files and directories to skip
+    :param int max_file_size: Skip files larger than this many bytes (e.g. generated code)
+    :param bool use_gitignore: Skip files excluded by .gitignore files
+    :param bool include_content: Include the source of every function in call_graph.json
+    :param bool compact_json: Write call_graph.json without indentation. Smaller and faster
+    :param str content_mode: 'inline' puts function content in call_graph.json. 'sidecar'
+        moves it to a call_graph.<id>.content sidecar and 'spans' only records where it is in the
+        source, leaving a small topology-only json (see utils.get_function_content)
+    :param bool generate_binary: Also write call_graph.bin, a memory-mappable form of the
+        graph's topology (see utils.get_binary_call_graph)
+    :param bool generate_database: Also store the graph in the SQLite database call_graph.db,
+        updating only the rows that changed since the last run (see utils.get_graph_database)
     """
     start_time = time.time()  # Start timer
 
@@ -498,40 +1244,41 @@ def code2flow(raw_source_paths, output_dir, hide_legend=True,
     include_only_functions = include_only_functions or []
     assert isinstance(include_only_functions, list)
 
+    if workers is None:
+        workers = os.cpu_count() or 1
+
     # Configure logging
     logging.basicConfig(format="Code2Flow: %(message)s", level=level)
     
     if silent:
         logging.disable(logging.CRITICAL + 1)
 
-    sources = get_sources(raw_source_paths)
+    discovery = dict(exclude_paths=exclude_paths, max_file_size=max_file_size,
+                     use_gitignore=use_gitignore)
+    if workers > 1:
+        # Let the pool start parsing while discovery is still running
+        sources = discover_sources(raw_source_paths, **discovery)
+    else:
+        sources = get_sources(raw_source_paths, **discovery)
 
     # Create output directory if it doesn't exist
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    # Primary processing
-    file_groups, all_nodes, edges = map_it(raw_source_paths[0], sources, 
-                                           no_trimming, skip_parse_errors)
-
-    # Remove duplicate nodes (external calls, etc.)
-    unique = {}
-    for node in all_nodes:
-        unique[node.uid] = node
-    all_nodes = list(unique.values())
-
-    # Sort for deterministic output
-    all_nodes.sort()
-    file_groups.sort()
-    edges.sort()
+    cache = None
+    if use_cache:
+        cache = ExtractionCache(cache_dir or os.path.join(output_dir, CACHE_DIR_NAME),
+                                size_limit=cache_size_limit)
 
-    processor = Processor(all_nodes, edges)
-    if generate_json:
-        _write_call_graph(output_dir, processor.get())
-
-    if generate_image:
-        _generate_img(output_dir, all_nodes, edges,
-                      file_groups, hide_legend, no_grouping)
+    # Primary processing
+    file_groups, all_nodes, edges = map_it(raw_source_paths, sources,
+                                           no_trimming, skip_parse_errors, workers, cache)
+
+    write_outputs(output_dir, file_groups, all_nodes, edges, generate_json=generate_json,
+                  generate_image=generate_image, hide_legend=hide_legend,
+                  no_grouping=no_grouping, include_content=include_content,
+                  compact_json=compact_json, content_mode=content_mode,
+                  generate_binary=generate_binary, generate_database=generate_database)
 
     logging.info("Completed in %.2f seconds." %
                  (time.time() - start_time))
@@ -0,0 +1,111 @@
+import collections
+from array import array
+
+from .model import Edge
+
+
+class CallGraph():
+    """
+    Integer-id core of the call graph.
+    Nodes get dense ids in the order they are added and the edges live in two
+    parallel arrays of ids, so dedup, degrees, leaf/trunk flags and trimming
+    run over flat integer arrays instead of Node objects.
+    Edge objects are only built as a view for the DOT / JSON writers.
+    """
+    def __init__(self, nodes=()):
+        """
+        :param list[Node] nodes:
+        """
+        self.nodes = []          # id -> Node
+        self.ids = {}            # Node -> id
+        self.external_ids = {}   # external method name -> id
+        self.sources = array('i')
+        self.targets = array('i')
+        for node in nodes:
+            self.add_node(node)
+
+    def __repr__(self):
+        return f"<CallGraph nodes={len(self.nodes)} edges={len(self.sources)}>"
+
+    def add_node(self, node):
+        """
+        :param Node node:
+        :rtype: int: the id of the node
+        """
+        node_id = self.ids.get(node)
+        if node_id is None:
+            node_id = self.ids[node] = len(self.nodes)
+            self.nodes.append(node)
+        return node_id
+
+    def node_id(self, node):
+        """
+        The id of node. External nodes are created once per call they stand
+        for, so they share an id by name.
+
+        :param Node node:
+        :rtype: int
+        """
+        if node.parent is None:
+            node_id = self.external_ids.get(node.token)
+            if node_id is None:
+                node_id = self.external_ids[node.token] = self.add_node(node)
+            return node_id
+        return self.ids[node]
+
+    def add_edge(self, node_a, node_b):
+        """
+        :param Node node_a: caller
+        :param Node node_b: callee
+        :rtype: None
+        """
+        self.sources.append(self.node_id(node_a))
+        self.targets.append(self.node_id(node_b))
+
+    def unique_edges(self):
+        """
+        Edges without duplicates, in order of first appearance
+        :rtype: list[(int, int)]
+        """
+        return list(dict.fromkeys(zip(self.sources, self.targets)))
+
+    def degrees(self):
+        """
+        :rtype: (array, array): out-degree and in-degree by node id
+        """
+        out_degree = array('i', bytes(4 * len(self.nodes)))
+        in_degree = array('i', bytes(4 * len(self.nodes)))
+        for node_id, count in collections.Counter(self.sources).items():
+            out_degree[node_id] = count
+        for node_id, count in collections.Counter(self.targets).items():
+            in_degree[node_id] = count
+        return out_degree, in_degree
+
+    def flag_leaves_and_trunks(self):
+        """
+        A node is a leaf when it calls nothing and a trunk when nothing calls it
+        :rtype: None
+        """
+        out_degree, in_degree = self.degrees()
+        for node, out_count, in_count in zip(self.nodes, out_degree, in_degree):
+            node.is_leaf = not out_count
+            node.is_trunk = not in_count
+
+    def connected_nodes(self):
+        """
+        Nodes with at least one edge, in order of first appearance in the edges
+        :rtype: list[Node]
+        """
+        pairs = self.unique_edges()
+        ends = array('i', bytes(8 * len(pairs)))
+        ends[0::2] = array('i', (a for a, _ in pairs))
+        ends[1::2] = array('i', (b for _, b in pairs))
+        return [self.nodes[node_id] for node_id in dict.fromkeys(ends)]
+
+    def edges(self):
+        """
+        Edge objects for the writers
+        :rtype: list[Edge]
+        """
+        nodes = self.nodes
+        return [Edge(nodes[a], nodes[b]) for a, b in zip(self.sources, self.targets)]
@@ -0,0 +1,350 @@
+import logging
+import math
+
+from ordered_set import OrderedSet
+
+from .engine import (make_file_groups, _ExternalTracker, _find_links, _get_paths,
+                     _log_bad_calls, _module_path, _resolve_inherits, _trim_orphans)
+from .graph import CallGraph
+from .index import DefinitionIndex, ImportIndex
+from .model import Call, Group, Node, Variable, flatten
+
+
+def _dotted_prefixes(token):
+    """
+    'a.b.c' -> ['a', 'a.b', 'a.b.c']
+    :param str token:
+    :rtype: list[str]
+    """
+    parts = token.split('.')
+    return ['.'.join(parts[:i]) for i in range(1, len(parts) + 1)]
+
+
+def _file_symbols(root_path, file_group):
+    """
+    Every symbol a file provides to the rest of the project: its module path
+    and the tokens and import tokens of all of its groups and nodes.
+    Calls elsewhere can only link differently when one of these changes.
+
+    :param str|list[str] root_path:
+    :param Group file_group: unresolved file group
+    :rtype: set[str]
+    """
+    symbols = {_module_path(root_path, file_group.file_name)}
+    for group in file_group.all_groups():
+        symbols.add(group.token)
+        symbols.update(group.import_tokens)
+    for node in file_group.all_nodes():
+        symbols.add(node.token)
+        symbols.update(node.import_tokens)
+    return symbols
+
+
+def _file_dependencies(file_group):
+    """
+    Every symbol the resolution and linking of a file can look up in other files.
+    This is an over-approximation: call tokens, owners, imports, constructor
+    calls and base classes.
+
+    :param Group file_group: unresolved file group
+    :rtype: set[str]
+    """
+    deps = set()
+    for group in file_group.all_groups():
+        deps.update(group.inherits)
+    for node in file_group.all_nodes():
+        for call in node.calls:
+            deps.add(call.token)
+            if call.owner_token:
+                deps.update(_dotted_prefixes(call.owner_token))
+        for variable in node.variables:
+            if isinstance(variable.points_to, str):
+                deps.update(_dotted_prefixes(variable.points_to))
+            elif isinstance(variable.points_to, Call):
+                deps.add(variable.points_to.token)
+    return deps
+
+
+def _mro_dependencies(file_group):
+    """
+    Tokens of every group in the MRO of the groups a resolved file can call
+    methods on. Inherited methods can come from files the file never names.
+
+    :param Group file_group: resolved file group
+    :rtype: set[str]
+    """
+    groups = file_group.all_groups()
+    for node in file_group.all_nodes():
+        groups += [v.points_to for v in node.variables if isinstance(v.points_to, Group)]
+    deps = set()
+    for group in groups:
+        deps.update(g.token for g in group.mro())
+    return deps
+
+
+class _RecordingDict(dict):
+    """
+    Dict that remembers which keys were tested with `in`.
+    Used to learn which module paths a file's calls depend on.
+    """
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.seen = set()
+
+    def __contains__(self, key):
+        self.seen.add(key)
+        return super().__contains__(key)
+
+
+class IncrementalModel():
+    """
+    An untrimmed, linked call graph that can be updated in place.
+
+    After a file is added, modified or deleted, only that file is re-extracted.
+    Only the files whose calls could now resolve differently are re-resolved and
+    re-linked. Those are the files that depend on a symbol the changed files
+    provided before or provide now. Everything else keeps its links.
+    The graph returned by update() is the same as map_it would return
+    for the new set of sources.
+    """
+    def __init__(self, root_path, sources, no_trimming=False, skip_parse_errors=False,
+                 workers=1, cache=None):
+        """
+        :param str|list[str] root_path: the root (or roots) the sources were found in
+        :param list[str] sources:
+        :param bool no_trimming:
+        :param bool skip_parse_errors:
+        :param int workers: number of processes used to extract files
+        :param ExtractionCache cache:
+        """
+        self.root_path = root_path
+        self.no_trimming = no_trimming
+        self.skip_parse_errors = skip_parse_errors
+        self.workers = workers
+        self.cache = cache
+
+        self.sources = []
+        self.file_groups = {}     # source -> Group
+        self._symbols = {}        # source -> symbols it provides
+        self._static_deps = {}    # source -> symbols it may look up
+        self._path_deps = {}      # source -> module paths it looked up
+        self._mro_deps = {}       # source -> groups its method lookups walked through
+        self._children = {}       # group -> (nodes, subgroups) before trimming
+        self._variables = {}      # node -> variable facts before resolution
+        self._links = {}          # node -> [(Node|None, Call|None)]
+        self._added = {}          # node -> external method names it added
+        self._checked = {}        # node -> {method name: was external}
+
+        self._extract(sorted(sources))
+        self._relink(set(self.sources))
+
+    def __repr__(self):
+        return f"<IncrementalModel sources={len(self.sources)}>"
+
+    def update(self, added=(), modified=(), deleted=()):
+        """
+        Apply file changes and return the new graph.
+        Paths must be spelled the way they appear in sources.
+
+        :param list[str] added:
+        :param list[str] modified:
+        :param list[str] deleted:
+        :rtype: (list[Group], list[Node], list[Edge])
+        """
+        changed = OrderedSet(added) | OrderedSet(modified)
+        changed_symbols = set()
+        for source in OrderedSet(deleted) | changed:
+            if source in self.file_groups:
+                changed_symbols |= self._symbols[source]
+                self._forget(source)
+        self.sources = sorted(self.file_groups)
+
+        changed_symbols |= self._extract(sorted(changed))
+
+        dirty = {source for source in self.sources
+                 if source in changed
+                 or self._static_deps[source] & changed_symbols
+                 or self._path_deps[source] & changed_symbols
+                 or self._mro_deps[source] & changed_symbols}
+        dirty |= self._stale_sources(dirty)
+        logging.info("Relinking %d of %d file(s).", len(dirty), len(self.sources))
+        self._relink(dirty)
+        return self.graph()
+
+    def graph(self):
+        """
+        Build the edges from the stored links and trim like map_it does.
+        The groups returned are the live model and are only valid until the
+        next update.
+
+        :rtype: (list[Group], list[Node], list[Edge])
+        """
+        file_groups = self._restore_children()
+        all_nodes = flatten(g.all_nodes() for g in file_groups)
+
+        bad_calls = []
+        graph = CallGraph(all_nodes)
+        for node_a in all_nodes:
+            for node_b, bad_call in self._links[node_a]:
+                if bad_call:
+                    bad_calls.append(bad_call)
+                if not node_b:
+                    continue
+                graph.add_edge(node_a, node_b)
+        graph.flag_leaves_and_trunks()
+        edges = graph.edges()
+        _log_bad_calls(bad_calls)
+
+        if self.no_trimming:
+            return file_groups, list(graph.nodes), edges
+        file_groups, all_nodes = _trim_orphans(file_groups, graph)
+        return file_groups, all_nodes, edges
+
+    def _extract(self, sources):
+        """
+        Extract sources and remember the state needed to reset them later.
+
+        :param list[str] sources:
+        :rtype: set[str]: symbols provided by the extracted files
+        """
+        symbols = set()
+        for file_group in make_file_groups(sources, self.skip_parse_errors,
+                                           self.workers, self.cache):
+            source = file_group.file_name
+            self.file_groups[source] = file_group
+            self._symbols[source] = _file_symbols(self.root_path, file_group)
+            self._static_deps[source] = _file_dependencies(file_group)
+            self._path_deps[source] = set()
+            self._mro_deps[source] = set()
+            for group in file_group.all_groups():
+                self._children[group] = (list(group.nodes), list(group.subgroups))
+            for node in file_group.all_nodes():
+                self._variables[node] = [v.to_facts(node.parent) for v in node.variables]
+            symbols |= self._symbols[source]
+        self.sources = sorted(self.file_groups)
+        return symbols
+
+    def _forget(self, source):
+        file_group = self.file_groups.pop(source)
+        self._restore_children([file_group])
+        for group in file_group.all_groups():
+            del self._children[group]
+        for node in file_group.all_nodes():
+            del self._variables[node]
+            for store in (self._links, self._added, self._checked):
+                store.pop(node, None)
+        for store in (self._symbols, self._static_deps, self._path_deps, self._mro_deps):
+            del store[source]
+
+    def _restore_children(self, file_groups=None):
+        """
+        Undo the trimming done by the last call to graph()
+        :rtype: list[Group]
+        """
+        if file_groups is None:
+            file_groups = [self.file_groups[s] for s in self.sources]
+        for file_group in file_groups:
+            stack = [file_group]
+            while stack:
+                group = stack.pop()
+                group.nodes, group.subgroups = map(list, self._children[group])
+                stack += group.subgroups
+        return file_groups
+
+    def _stale_sources(self, dirty):
+        """
+        Safety net: clean files still pointing to a node or group that no longer exists
+
+        :param set[str] dirty:
+        :rtype: set[str]
+        """
+        file_groups = self._restore_children()
+        live = set(flatten(g.all_nodes() for g in file_groups))
+        live |= set(flatten(g.all_groups() for g in file_groups))
+        stale = set()
+        for source in self.sources:
+            if source in dirty:
+                continue
+            if any(base not in live for group in self.file_groups[source].all_groups()
+                   for base in group.bases):
+                stale.add(source)
+                continue
+            for node in self.file_groups[source].all_nodes():
+                targets = [node_b for node_b, _ in self._links[node] if node_b and node_b.parent]
+                targets += [v.points_to for v in node.variables
+                            if isinstance(v.points_to, (Node, Group))]
+                if any(t not in live for t in targets):
+                    stale.add(source)
+                    break
+        return stale
+
+    def _relink(self, dirty):
+        """
+        Redo map_it steps 3 to 6 for the dirty sources.
+
+        :param set[str] dirty:
+        :rtype: None
+        """
+        file_groups = self._restore_children()
+        for source in dirty:
+            for node in self.file_groups[source].all_nodes():
+                node.variables = [Variable.from_facts(v, node.parent)
+                                  for v in self._variables[node]]
+
+        # 3. Consolidate structures
+        all_subgroups = flatten(g.all_groups() for g in file_groups)
+        all_nodes = flatten(g.all_nodes() for g in file_groups)
+        _resolve_inherits(all_subgroups, flatten(self.file_groups[s].all_groups()
+                                                 for s in self.sources if s in dirty))
+
+        # 4. Attempt to resolve the variables (point them to a node or group)
+        imports = ImportIndex(file_groups)
+        for source in self.sources:
+            if source in dirty:
+                for node in self.file_groups[source].all_nodes():
+                    node.resolve_variables(imports)
+        for source in dirty:
+            for node in self.file_groups[source].all_nodes():
+                node.build_scope()
+            for group in self.file_groups[source].all_groups():
+                group.build_scope()
+            self._mro_deps[source] = _mro_dependencies(self.file_groups[source])
+
+        # 5. Find external calls (calls to functions that are not in the source code)
+        all_group_names = OrderedSet([g.token for g in all_subgroups])
+        positions = {node: i for i, node in enumerate(all_nodes)}
+        first_added = {}
+        for node in all_nodes:
+            if node.file_group().file_name not in dirty:
+                for method_name in self._added[node]:
+                    first_added.setdefault(method_name, positions[node])
+        external = _ExternalTracker(first_added)
+
+        # 6. Find all calls between all nodes
+        for node in all_nodes:
+            node.is_leaf = node.is_trunk = True
+        paths = _RecordingDict(_get_paths(self.root_path, file_groups))
+        index = DefinitionIndex(all_nodes)
+        for source in dirty:
+            self._path_deps[source] = set()
+
+        def link(node_a):
+            paths.seen = self._path_deps[node_a.file_group().file_name]
+            external.start(positions[node_a])
+            self._links[node_a] = _find_links(node_a, index, external,
+                                              all_group_names, paths)
+            self._added[node_a] = external.added
+            self._checked[node_a] = external.checked
+
+        clean = []
+        for node_a in all_nodes:
+            if node_a.file_group().file_name in dirty:
+                link(node_a)
+            else:
+                clean.append(node_a)
+
+        # Clean nodes whose calls would now see a different set of external names
+        for node_a in clean:
+            if any((first_added.get(m, math.inf) < positions[node_a]) != was_external
+                   for m, was_external in self._checked[node_a].items()):
+                link(node_a)
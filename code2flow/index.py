@@ -0,0 +1,76 @@
+from .model import GROUP_TYPE, Group
+
+
+class DefinitionIndex():
+    """
+    Hash indexes over every function in the project.
+    When the in-scope variables don't resolve a call, these give the candidate
+    definitions for it without scanning all nodes.
+    """
+    def __init__(self, all_nodes):
+        """
+        :param list[Node] all_nodes:
+        """
+        by_token = {}
+        file_functions = {}
+        constructors = {}
+        for node in all_nodes:
+            by_token.setdefault(node.token, []).append(node)
+            if isinstance(node.parent, Group) and node.parent.group_type == GROUP_TYPE.FILE:
+                file_functions.setdefault(node.token, []).append(node)
+            elif node.is_constructor:
+                constructors.setdefault(node.parent.token, []).append(node)
+        self.by_token = by_token                # token -> functions and methods
+        self.file_functions = file_functions    # token -> functions defined on a file
+        self.constructors = constructors        # class token -> constructors
+
+    def __repr__(self):
+        return f"<DefinitionIndex tokens={len(self.by_token)}>"
+
+    def candidates(self, call, node_a):
+        """
+        All nodes that the call could link to by name alone.
+        Attribute calls (`a.b()`) match any method or function named like the call
+        outside of the calling file. Naked calls (`b()`) match functions defined on
+        a file and the constructors of classes named like the call.
+
+        :param Call call:
+        :param Node node_a: the node making the call
+        :rtype: list[Node]
+        """
+        if call.is_attr():
+            # excluding the calling file prevents self linkage in cases like
+            # function a() {b = Obj(); b.a()}
+            file_group = node_a.file_group()
+            return [node for node in self.by_token.get(call.token, ())
+                    if node.parent != file_group]
+        return self.file_functions.get(call.token, []) + self.constructors.get(call.token, [])
+
+
+class ImportIndex():
+    """
+    Hash indexes over the import tokens and the names of every group in the
+    project. Used to resolve variables (map_it step 4) without scanning
+    every file for every variable.
+    """
+    def __init__(self, file_groups):
+        """
+        :param list[Group] file_groups:
+        """
+        by_import_token = {}
+        groups_by_token = {}
+        for file_group in file_groups:
+            # first match wins: files in order, nodes before groups
+            for node in file_group.all_nodes():
+                for import_token in node.import_tokens:
+                    by_import_token.setdefault(import_token, node)
+            for group in file_group.all_groups():
+                for import_token in group.import_tokens:
+                    by_import_token.setdefault(import_token, group)
+                # last match wins
+                groups_by_token[group.token] = group
+        self.by_import_token = by_import_token  # import token -> Node|Group
+        self.groups_by_token = groups_by_token  # token -> Group
+
+    def __repr__(self):
+        return f"<ImportIndex imports={len(self.by_import_token)}>"
@@ -1,6 +1,10 @@
 import abc
+import bisect
+import functools
+import hashlib
 import os
-from astunparse import unparse
+import sys
+import textwrap
 
 TRUNK_COLOR = '#966F33'
 LEAF_COLOR = '#6db33f'
@@ -13,11 +17,14 @@ class Namespace(dict):
     """
     Abstract constants class
     Constants can be accessed via .attribute or [key] and can be iterated over.
+    They are also stored as plain instance attributes so that .attribute
+    doesn't go through __getattr__.
     """
     def __init__(self, *args, **kwargs):
         d = {k: k for k in args}
         d.update(dict(kwargs.items()))
         super().__init__(d)
+        self.__dict__.update(d)
 
     def __getattr__(self, item):
         return self[item]
@@ -61,26 +68,124 @@ def flatten(list_of_lists):
     return [el for sublist in list_of_lists for el in sublist]
 
 
-def _resolve_str_variable(variable, file_groups):
+def _resolve_str_variable(variable, imports):
     """
     String variables are when variable.points_to is a string
     This happens ONLY when we have imports that we delayed processing for
 
-    This function looks through all files to see if any particular node matches
-    the variable.points_to string
+    This function looks up the node or group in any file whose import token
+    matches the variable.points_to string
 
     :param Variable variable:
-    :param list[Group] file_groups:
+    :param ImportIndex imports:
     :rtype: Node|Group|str
     """
-    for file_group in file_groups:
-        for node in file_group.all_nodes():
-            if any(ot == variable.points_to for ot in node.import_tokens):
-                return node
-        for group in file_group.all_groups():
-            if any(ot == variable.points_to for ot in group.import_tokens):
-                return group
-    return variable.points_to
+    return imports.by_import_token.get(variable.points_to, variable.points_to)
+
+
+def _stable_uid(prefix, file_name, qualified_token, occurrence=0):
+    """
+    A uid that is the same on every run: 128 bits of the hash of the
+    file path and the qualified token. occurrence tells apart definitions
+    that share both, e.g. a function redefined further down a file.
+
+    :param str prefix:
+    :param str file_name: absolute, like the file_name of the json, so
+                          'pkg/a.py' and './pkg/a.py' give the same uids
+    :param str qualified_token:
+    :param int occurrence:
+    :rtype: str
+    """
+    key = f"{file_name}::{qualified_token}"
+    if occurrence:
+        key += f"#{occurrence}"
+    return f"{prefix}_{hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]}"
+
+
+def assign_unique_uids(file_group):
+    """
+    Set the uids of the nodes and groups of a file. Those that share a
+    qualified token get distinct uids, numbered in definition order.
+    The path is made absolute once for the whole file.
+
+    :param Group file_group:
+    :rtype: None
+    """
+    file_name = os.path.abspath(file_group.file_name)
+    seen = {}
+    for el, prefix in ([(g, 'cluster') for g in file_group.all_groups()]
+                       + [(n, 'node') for n in file_group.all_nodes()]):
+        qualified_token = el.qualified_token()
+        occurrence = seen.get((prefix, qualified_token), 0)
+        seen[(prefix, qualified_token)] = occurrence + 1
+        el.uid = _stable_uid(prefix, file_name, qualified_token, occurrence)
+
+
+@functools.lru_cache(maxsize=16)
+def _read_source_lines(file_name, mtime_ns, size):
+    """
+    The lines of a file as bytes. Cached on the file's mtime and size so
+    consecutive spans from one file only read it once.
+    :rtype: list[bytes]
+    """
+    with open(file_name, 'rb') as f:
+        return f.read().splitlines(keepends=True)
+
+
+class SourceSpan():
+    """
+    Lazy reference to the source of a function in its file.
+    The text is only read from disk (see read()) when it is serialised.
+    """
+    __slots__ = ('file_name', 'start_line', 'end_line', 'end_col')
+
+    def __init__(self, file_name, start_line, end_line, end_col):
+        """
+        :param str file_name:
+        :param int start_line: first line, including decorators (1-indexed)
+        :param int end_line: last line (1-indexed)
+        :param int end_col: utf-8 byte offset where the definition ends on end_line
+        """
+        self.file_name = file_name
+        self.start_line = start_line
+        self.end_line = end_line
+        self.end_col = end_col
+
+    def __repr__(self):
+        return f"<SourceSpan {self.file_name}:{self.start_line}-{self.end_line}>"
+
+    @staticmethod
+    def from_tree(file_name, tree):
+        """
+        :param str file_name:
+        :param tree ast: a function definition
+        :rtype: SourceSpan
+        """
+        start_line = min([tree.lineno] + [d.lineno for d in tree.decorator_list])
+        return SourceSpan(file_name, start_line, tree.end_lineno, tree.end_col_offset)
+
+    def to_facts(self):
+        """
+        Compact, picklable form of this span. The file name comes from the node.
+        :rtype: tuple
+        """
+        return (self.start_line, self.end_line, self.end_col)
+
+    def read(self):
+        """
+        The original source text of the span, dedented
+        :rtype: str
+        """
+        try:
+            stat = os.stat(self.file_name)
+            lines = _read_source_lines(self.file_name, stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            # The file went away after it was parsed
+            return ''
+        lines = lines[self.start_line - 1:self.end_line]
+        if lines:
+            lines[-1] = lines[-1][:self.end_col]
+        return textwrap.dedent(b''.join(lines).decode('utf-8', errors='replace'))
 
 
 class BaseLanguage(abc.ABC):
@@ -102,9 +207,10 @@ class BaseLanguage(abc.ABC):
 
     @staticmethod
     @abc.abstractmethod
-    def get_tree(filename):
+    def get_tree(filename, content=None):
         """
         :param filename str:
+        :param content bytes:
         :rtype: Tree
         """
 
@@ -150,6 +256,8 @@ class Variable():
     They may either point to a string or, once resolved, a Group/Node.
     Not all variables can be resolved
     """
+    __slots__ = ('token', 'points_to', 'line_number')
+
     def __init__(self, token, points_to, line_number=None):
         """
         :param str token:
@@ -158,13 +266,47 @@ class Variable():
         """
         assert token
         assert points_to
-        self.token = token
+        self.token = sys.intern(token)
         self.points_to = points_to
         self.line_number = line_number
 
     def __repr__(self):
         return f"<Variable token={self.token} points_to={repr(self.points_to)}"
 
+    def to_facts(self, parent):
+        """
+        Compact, picklable form of an unresolved variable.
+        Only the variables made during extraction can be converted. Those point
+        to an import string, a Call or (for `self`) the parent group.
+
+        :param Group parent: the group that owns the node of this variable
+        :rtype: tuple
+        """
+        if isinstance(self.points_to, Call):
+            points_to = self.points_to.to_facts()
+        elif isinstance(self.points_to, str):
+            points_to = self.points_to
+        else:
+            assert self.points_to is parent
+            points_to = None
+        return (self.token, points_to, self.line_number)
+
+    @staticmethod
+    def from_facts(facts, parent):
+        """
+        Inverse of Variable.to_facts
+
+        :param tuple facts:
+        :param Group parent:
+        :rtype: Variable
+        """
+        token, points_to, line_number = facts
+        if points_to is None:
+            points_to = parent
+        elif isinstance(points_to, (tuple, list)):
+            points_to = Call.from_facts(points_to)
+        return Variable(token, points_to, line_number)
+
     def to_string(self):
         """
         For logging
@@ -184,15 +326,34 @@ class Call():
         do_something()
 
     """
+    __slots__ = ('token', 'owner_token', 'line_number', 'definite_constructor')
+
     def __init__(self, token, line_number=None, owner_token=None, definite_constructor=False):
-        self.token = token
-        self.owner_token = owner_token
+        # tokens like `self`, `print` or `__init__` repeat a lot. Keep one copy of each
+        self.token = sys.intern(token)
+        self.owner_token = sys.intern(owner_token) if owner_token else owner_token
         self.line_number = line_number
         self.definite_constructor = definite_constructor
 
     def __repr__(self):
         return f"<Call owner_token={self.owner_token} token={self.token}>"
 
+    def to_facts(self):
+        """
+        Compact, picklable form of this call
+        :rtype: tuple
+        """
+        return (self.token, self.line_number, self.owner_token, self.definite_constructor)
+
+    @staticmethod
+    def from_facts(facts):
+        """
+        Inverse of Call.to_facts
+        :param tuple facts:
+        :rtype: Call
+        """
+        return Call(*facts)
+
     def to_string(self):
         """
         Returns a representation of this call to be printed by the engine
@@ -228,10 +389,10 @@ class Call():
                 for node in getattr(variable.points_to, 'nodes', []):
                     if self.token == node.token:
                         return node
-                for inherit_nodes in getattr(variable.points_to, 'inherits', []):
-                    for node in inherit_nodes:
-                        if self.token == node.token:
-                            return node
+                if isinstance(variable.points_to, Group):
+                    node = variable.points_to.get_method(self.token)
+                    if node:
+                        return node
                 if variable.points_to in OWNER_CONST:
                     return variable.points_to
 
@@ -260,45 +421,87 @@ class Call():
 
 
 class Node():
+    __slots__ = ('token', 'line_number', 'calls', 'variables', 'import_tokens', 'parent',
+                 'is_constructor', 'uid', 'is_leaf', 'is_trunk', 'scope', 'content', '_name')
+
     @staticmethod
     def external_node(method_name : str):
         n = Node(method_name, [], [], None, None)
-        n.uid = f'external_{method_name.replace(".", "_")}'
+        n.uid = _stable_uid('external', '', method_name)
         return n
     
     def __init__(self, token, calls, variables, parent, node, import_tokens=None,
                  line_number=None, is_constructor=False):
-        self.token = token
+        self.token = sys.intern(token)
         self.line_number = line_number
         self.calls = calls
         self.variables = variables
         self.import_tokens = import_tokens or []
         self.parent = parent
         self.is_constructor = is_constructor
-
-        self.uid = "node_" + os.urandom(4).hex()
+        self._name = None
+        self.uid = None  # set by assign_unique_uids once the file group is complete
 
         # Assume it is a leaf and a trunk. These are modified later
         self.is_leaf = True  # it calls nothing else
         self.is_trunk = True  # nothing calls it
-        self.content = unparse(node) if node else None
+        # Precomputed by build_scope once the variables are resolved
+        self.scope = None
+        # Where the source of this function is. Only read when it is serialised
+        self.content = SourceSpan.from_tree(self.file_group().file_name, node) if node else None
 
     def __repr__(self):
         return f"<Node token={self.token} parent={self.parent}>"
 
+    def to_facts(self):
+        """
+        Compact, picklable form of an unresolved node.
+        Used to ship extraction results between processes.
+        :rtype: tuple
+        """
+        return (self.token,
+                [c.to_facts() for c in self.calls],
+                [v.to_facts(self.parent) for v in self.variables],
+                self.import_tokens,
+                self.line_number,
+                self.is_constructor,
+                self.content.to_facts() if self.content else None)
+
+    @staticmethod
+    def from_facts(facts, parent):
+        """
+        Inverse of Node.to_facts
+
+        :param tuple facts:
+        :param Group parent:
+        :rtype: Node
+        """
+        token, calls, variables, import_tokens, line_number, is_constructor, content = facts
+        node = Node(token,
+                    [Call.from_facts(c) for c in calls],
+                    [Variable.from_facts(v, parent) for v in variables],
+                    parent, None, import_tokens=import_tokens,
+                    line_number=line_number, is_constructor=is_constructor)
+        if content:
+            node.content = SourceSpan(node.file_group().file_name, *content)
+        return node
+
     def __lt__(self, other):
         return self.name() < other.name()
 
     def name(self):
         """
-        Names exist largely for unit tests and deterministic node sorting
+        Names exist largely for unit tests and deterministic node sorting.
+        Computed once: a node never moves to another group.
         :rtype: str
         """
-        group = self.first_group()
-        if not group:
-            return f'EXTERNAL::{self.token}'
-        else:
-            return f"{self.first_group().filename()}::{self.token_with_ownership()}"
+        if self._name is None:
+            group = self.first_group()
+            if not group:
+                self._name = f'EXTERNAL::{self.token}'
+            else:
+                self._name = f"{group.filename()}::{self.token_with_ownership()}"
+        return self._name
 
     def first_group(self):
         """
@@ -345,6 +548,18 @@ class Node():
             return djoin(self.parent.token, self.token)
         return self.token
 
+    def qualified_token(self):
+        """
+        Token which includes every group this is nested in, except the file
+        :rtype: str
+        """
+        parts = [self.token]
+        parent = self.parent
+        while parent and parent.parent:
+            parts.append(parent.token)
+            parent = parent.parent
+        return djoin(parts[::-1])
+
     def namespace_ownership(self):
         """
         Get the ownership excluding namespace
@@ -396,17 +611,44 @@ class Node():
             parent = parent.parent
         return ret
 
-    def resolve_variables(self, file_groups):
+    def build_scope(self):
+        """
+        Precompute the scope table of this node's own variables.
+        Call again whenever self.variables is replaced or extended.
+        Resolving variables doesn't invalidate it.
+        :rtype: ScopeTable
+        """
+        self.scope = ScopeTable(self.variables)
+        return self.scope
+
+    def get_variables_named(self, tokens, line_number=None):
+        """
+        The variables returned by get_variables(line_number) whose token is one
+        of tokens, in the same order. Uses the precomputed scope tables of this
+        node and its parents.
+
+        :param tuple[str] tokens:
+        :param int line_number:
+        :rtype: list[Variable]
+        """
+        ret = (self.scope or self.build_scope()).lookup(tokens, line_number)
+        parent = self.parent
+        while parent:
+            ret += (parent.scope or parent.build_scope()).lookup(tokens)
+            parent = parent.parent
+        return ret
+
+    def resolve_variables(self, imports):
         """
         For all variables, attempt to resolve the Node/Group on points_to.
         There is a good chance this will be unsuccessful.
 
-        :param list[Group] file_groups:
+        :param ImportIndex imports: import tokens and group names of every file
         :rtype: None
         """
         for variable in self.variables:
             if isinstance(variable.points_to, str):
-                variable.points_to = _resolve_str_variable(variable, file_groups)
+                variable.points_to = _resolve_str_variable(variable, imports)
             elif isinstance(variable.points_to, Call):
                 # else, this is a call variable
                 call = variable.points_to
@@ -414,11 +656,10 @@ class Node():
                 if call.is_attr() and not call.definite_constructor:
                     continue
                 # Else, assume the call is a constructor.
-                # iterate through to find the right group
-                for file_group in file_groups:
-                    for group in file_group.all_groups():
-                        if group.token == call.token:
-                            variable.points_to = group
+                # look up the group named like the call
+                group = imports.groups_by_token.get(call.token)
+                if group:
+                    variable.points_to = group
             else:
                 assert isinstance(variable.points_to, (Node, Group))
 
@@ -468,7 +709,114 @@ def _wrap_as_variables(sequence):
     return [Variable(el.token, el, el.line_number) for el in sequence]
 
 
+class ScopeTable():
+    """
+    Immutable view of the variables defined in one node or group, sorted by
+    line number (latest first) and indexed by token.
+    """
+    __slots__ = ('variables', '_neg_lines', '_by_token')
+
+    def __init__(self, variables):
+        """
+        :param list[Variable] variables:
+        """
+        # stable, so variables on the same line keep their definition order
+        self.variables = tuple(sorted(variables, key=lambda v: v.line_number, reverse=True))
+        self._neg_lines = [-v.line_number for v in self.variables]
+        by_token = {}
+        for i, variable in enumerate(self.variables):
+            by_token.setdefault(variable.token, []).append(i)
+        self._by_token = by_token
+
+    def __repr__(self):
+        return f"<ScopeTable variables={len(self.variables)}>"
+
+    def lookup(self, tokens, line_number=None):
+        """
+        Variables named like one of tokens and defined on or before line_number,
+        latest first.
+
+        :param tuple[str] tokens:
+        :param int|None line_number: None for every variable
+        :rtype: list[Variable]
+        """
+        positions = []
+        for token in tokens:
+            positions += self._by_token.get(token, ())
+        if not positions:
+            return []
+        if len(tokens) > 1:
+            positions = sorted(set(positions))
+        if line_number is not None:
+            start = bisect.bisect_left(self._neg_lines, -line_number)
+            positions = [i for i in positions if i >= start]
+        return [self.variables[i] for i in positions]
+
+
+def _c3_merge(sequences):
+    """
+    Merge step of the C3 linearisation.
+    :param list[list[Group]] sequences:
+    :rtype: list[Group]|None: None when there is no consistent order
+    """
+    sequences = [list(seq) for seq in sequences if seq]
+    ret = []
+    while sequences:
+        for seq in sequences:
+            head = seq[0]
+            if not any(head in other[1:] for other in sequences):
+                break
+        else:
+            return None
+        ret.append(head)
+        for seq in sequences:
+            if seq[0] is head:
+                del seq[0]
+        sequences = [seq for seq in sequences if seq]
+    return ret
+
+
+def _linearise(group, visiting):
+    """
+    C3 linearisation of group. Bases already being linearised (inheritance
+    cycles, e.g. `class Foo(Foo)` naming a class in another module) are skipped.
+    Inconsistent hierarchies fall back to depth-first order.
+
+    :param Group group:
+    :param set[Group] visiting:
+    :rtype: (list[Group], bool): the mro and whether no cycle was cut
+    """
+    if group._mro is not None:
+        return group._mro, True
+    visiting.add(group)
+    complete = True
+    bases = []
+    for base in group.bases:
+        if base in visiting:
+            complete = False
+        elif base not in bases:
+            bases.append(base)
+    base_mros = []
+    for base in bases:
+        mro, base_complete = _linearise(base, visiting)
+        if base_complete:
+            base._mro = mro
+        complete = complete and base_complete
+        base_mros.append(mro)
+    visiting.discard(group)
+
+    merged = _c3_merge(base_mros + [bases])
+    if merged is None:
+        merged = []
+        for el in flatten(base_mros):
+            if el not in merged:
+                merged.append(el)
+    return [group] + merged, complete
+
+
 class Edge():
+    __slots__ = ('node0', 'node1')
+
     def __init__(self, node0, node1):
         self.node0 = node0
         self.node1 = node1
@@ -486,6 +834,14 @@ class Edge():
             return self.node1 < other.node1
         return self.node0 < other.node0
 
+    def sort_key(self):
+        """
+        Sort key. Gives the same order as __lt__ whenever distinct nodes
+        have distinct names.
+        :rtype: (str, str)
+        """
+        return self.node0.name(), self.node1.name()
+
     def to_dot(self):
         '''
         Returns string format for embedding in a dotfile. Example output:
@@ -512,9 +868,13 @@ class Group():
     """
     Groups represent namespaces (classes and modules/files)
     """
+    __slots__ = ('token', 'line_number', 'nodes', 'root_node', 'subgroups', 'parent',
+                 'group_type', 'display_type', 'import_tokens', 'inherits', 'bases',
+                 '_mro', '_methods', 'uid', 'file_name', 'scope', 'import_map')
+
     def __init__(self, token, group_type, display_type, import_tokens=None,
                  line_number=None, parent=None, inherits=None, file_name=None):
-        self.token = token
+        self.token = sys.intern(token)
         self.line_number = line_number
         self.nodes = []
         self.root_node = None
@@ -523,14 +883,60 @@ class Group():
         self.group_type = group_type
         self.display_type = display_type
         self.import_tokens = import_tokens or []
-        self.inherits = inherits or []
+        self.inherits = inherits or []  # tokens of the base classes
+        self.bases = []  # groups named like the inherits. Set by map_it step 3
+        self._mro = None
+        self._methods = None
         assert group_type in GROUP_TYPE
-        self.uid = "cluster_" + os.urandom(4).hex()  # group doesn't work by syntax rules
         self.file_name = file_name
+        self.uid = None  # set by assign_unique_uids once the file group is complete
+        # Precomputed by build_scope once the variables are resolved
+        self.scope = None
+        self.import_map = None  # first in-scope variable per name -> what it points to
 
     def __repr__(self):
         return f"<Group token={self.token} type={self.display_type}>"
 
+    def to_facts(self):
+        """
+        Compact, picklable form of an unresolved group with all of its
+        nodes and subgroups. Used to ship extraction results between processes.
+        :rtype: tuple
+        """
+        root_index = self.nodes.index(self.root_node) if self.root_node else None
+        return (self.token,
+                self.group_type,
+                self.display_type,
+                self.import_tokens,
+                self.line_number,
+                self.inherits,
+                self.file_name,
+                [n.to_facts() for n in self.nodes],
+                root_index,
+                [g.to_facts() for g in self.subgroups])
+
+    @staticmethod
+    def from_facts(facts, parent=None):
+        """
+        Inverse of Group.to_facts
+
+        :param tuple facts:
+        :param Group|None parent:
+        :rtype: Group
+        """
+        (token, group_type, display_type, import_tokens, line_number, inherits,
+         file_name, nodes, root_index, subgroups) = facts
+        group = Group(token, group_type, display_type, import_tokens=import_tokens,
+                      line_number=line_number, parent=parent, inherits=inherits,
+                      file_name=file_name)
+        for i, node_facts in enumerate(nodes):
+            group.add_node(Node.from_facts(node_facts, group), is_root=i == root_index)
+        for subgroup_facts in subgroups:
+            group.add_subgroup(Group.from_facts(subgroup_facts, group))
+        if parent is None:
+            assign_unique_uids(group)
+        return group
+
     def __lt__(self, other):
         return self.label() < other.label()
 
@@ -541,6 +947,19 @@ class Group():
         """
         return f"{self.display_type}: {self.token}"
 
+    def qualified_token(self):
+        """
+        Token which includes every group this is nested in, except the file.
+        Empty for file groups.
+        :rtype: str
+        """
+        parts = []
+        group = self
+        while group.parent:
+            parts.append(group.token)
+            group = group.parent
+        return djoin(parts[::-1])
+
     def filename(self):
         """
         The ultimate filename of this group.
@@ -619,6 +1038,69 @@ class Group():
         else:
             return []
 
+    def build_scope(self):
+        """
+        Precompute the scope table of get_variables() and the import map.
+        Call again whenever the root node's variables, the nodes or the subgroups change.
+        :rtype: ScopeTable
+        """
+        self.scope = ScopeTable(self.get_variables())
+        import_map = {}
+        for variable in self.scope.variables:
+            import_map.setdefault(variable.token, variable.points_to)
+        self.import_map = import_map
+        return self.scope
+
+    def resolve_name(self, token):
+        """
+        What the first variable named token in get_variables() points to.
+        On a file group this resolves imported modules and names.
+
+        :param str token:
+        :rtype: Node|Group|str|None
+        """
+        if self.import_map is None:
+            self.build_scope()
+        return self.import_map.get(token)
+
+    def mro(self):
+        """
+        C3 linearisation of this group and the groups it inherits from.
+        Cached until clear_method_cache is called.
+        :rtype: list[Group]
+        """
+        if self._mro is None:
+            mro, complete = _linearise(self, set())
+            if not complete:
+                # an inheritance cycle was cut. Only valid from this group
+                return mro
+            self._mro = mro
+        return self._mro
+
+    def get_method(self, token):
+        """
+        The first node named token along the MRO - if any
+
+        :param str token:
+        :rtype: Node|None
+        """
+        if self._methods is None:
+            methods = {}
+            for group in self.mro():
+                for node in group.nodes:
+                    methods.setdefault(node.token, node)
+            self._methods = methods
+        return self._methods.get(token)
+
+    def clear_method_cache(self):
+        """
+        Forget the MRO and method table. Needed when the bases of this group
+        or of any group it inherits from change.
+        :rtype: None
+        """
+        self._mro = None
+        self._methods = None
+
     def remove_from_parent(self):
         """
         Remove this group from it's parent. This is effectively a deletion
@@ -1,81 +1,114 @@
 import os
 
-from ordered_set import OrderedSet
-from .model import Node
+from .model import Namespace, Node
+
+# Where the json puts the source of every function:
+# INLINE  - the text itself, under 'content'
+# SIDECAR - a [sidecar file name, byte offset, length] reference into the
+#           call_graph.<id>.content sidecar, under 'content_ref'
+# SPANS   - [start line, end line, end col] in the entry's file, under 'span'
+CONTENT_MODE = Namespace(INLINE='inline', SIDECAR='sidecar', SPANS='spans')
 
 
 class Processor():
-    def __init__(self, nodes, edges):
+    def __init__(self, nodes, edges, include_content=True, content_mode=CONTENT_MODE.INLINE):
+        assert content_mode in CONTENT_MODE.values(), f"Unknown content mode {content_mode!r}"
         self.nodes = nodes
         self.edges = edges
+        self.include_content = include_content
+        self.content_mode = content_mode
         self.calls = self._get_calls()
-        self._build_edges()
-        self.json = self._to_json()
-        self._resolve_callers()
+        self.winners = self._link_calls()
 
     def __str__(self) -> str:
         return f'{len(self.calls)} calls'
 
     def _get_calls(self):
         calls = {}
+        file_names = {}  # file group -> absolute path
         for node in self.nodes:
-            calls[node.uid] = FunctionCall(node)
+            file_group = node.file_group()
+            if file_group not in file_names:
+                file_names[file_group] = FunctionCall.resolve_filename(node)
+            calls[node.uid] = FunctionCall(node, self.include_content, file_names[file_group],
+                                           self.content_mode)
         return calls
 
-    def _build_edges(self):
-        for edge in self.edges:
-            caller_id = edge.to_dict()['source']
-            callee_id = edge.to_dict()['target']
-            directed = edge.to_dict()['directed']
-
-            if not directed:
-                raise Exception('Only directed edges are supported')
-
-            caller = self.calls[caller_id]
-            callee = self.calls[callee_id]
-
-            # We could add whole FunctionAll object
-            # caller.add_callee(callee)
-
-            # But we only want the name
-            caller.add_callee(callee.name)
-
-    def _resolve_callers(self):
-        for uid, call in self.json.items():
-            for callee in call['callees']:
-                self.json[callee]['callers'].append(uid)
-        
-        # Remove duplicates
-        for uid, call in self.json.items():
-            call['callers'] = list(OrderedSet(call['callers']))
+    def _link_calls(self):
+        """
+        Callees and callers of every call in one pass over the edges,
+        with the calls indexed by integer position.
+        Calls are keyed by name. When names collide, the last call wins.
+
+        :rtype: list[FunctionCall]: the calls that make it into the json, in order
+        """
+        calls = list(self.calls.values())
+        names = [call.name for call in calls]
+        positions = {uid: i for i, uid in enumerate(self.calls)}
+        callees = [[] for _ in calls]
+        for source, target in zip([positions[edge.node0.uid] for edge in self.edges],
+                                  [positions[edge.node1.uid] for edge in self.edges]):
+            callees[source].append(target)
+
+        winners = dict(zip(names, range(len(calls))))  # name -> position in the json
+        winner_of = [winners[name] for name in names]
+        callers = [{} for _ in calls]  # dicts as ordered sets of caller names
+        for name, i in winners.items():
+            for j in callees[i]:
+                callers[winner_of[j]][name] = None
+
+        ret = []
+        for i in winners.values():
+            call = calls[i]
+            call.callees = [names[j] for j in callees[i]]
+            call.callers = list(callers[i])
+            ret.append(call)
+        return ret
+
+    def __len__(self):
+        return len(self.winners)
+
+    def entries(self):
+        """
+        The json entries one at a time. Function content is only read from
+        disk as each entry is produced, so writers can stream the entries
+        without holding every function body in memory.
+
+        :rtype: Iterator[(str, dict)]: name -> entry
+        """
+        for call in self.winners:
+            yield call.name, call.to_dict()
 
-    def _to_json(self):
-        calls = {}
-        for call in self.calls.values():
-            calls[call.name] = call.to_dict()
-        return calls
-    
     def get(self):
-        return self.json
+        return dict(self.entries())
 
 
 class FunctionCall():
-    def __init__(self, node: Node):
+    def __init__(self, node: Node, include_content=True, file_name=None,
+                 content_mode=CONTENT_MODE.INLINE):
         self.uid = node.uid
         self.name = node.name()
-        self.ownership = node.token_with_ownership()
-        self.content = node.content if node.content else ''
+        self.node = node
+        # SourceSpan, only read from disk in to_dict
+        self.content = node.content
+        self.include_content = include_content
+        self.content_mode = content_mode
         self.callers = []
         self.callees = []
-        self.file_name = self._resolve_filename(node)
+        self.file_name = file_name or self.resolve_filename(node)
 
     def __str__(self):
         return f'{self.name}'
 
+    @property
+    def ownership(self):
+        return self.node.token_with_ownership()
+
     def add_callee(self, callee):
         self.callees.append(callee)
 
-    def _resolve_filename(self, node):
+    @staticmethod
+    def resolve_filename(node):
         if node.parent is None:
             return 'EXTERNAL'
         parent = node.parent
@@ -84,11 +117,19 @@ class FunctionCall():
         return os.path.abspath(parent.file_name)
 
     def to_dict(self):
-        return {
+        ret = {
             'uid': self.uid,
             'name': self.name,
-            'content': self.content,
+        }
+        if self.include_content:
+            if self.content_mode == CONTENT_MODE.SPANS:
+                ret['span'] = list(self.content.to_facts()) if self.content else None
+            else:
+                # sidecar content is moved out of the entry by the writer
+                ret['content'] = self.content.read() if self.content else ''
+        ret.update({
             'callers': self.callers,
             'callees': self.callees,
             'file_name': self.file_name,
-        }
+        })
+        return ret
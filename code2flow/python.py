@@ -1,4 +1,5 @@
 import ast
+import io
 import logging
 import os
 
@@ -38,25 +39,6 @@ def get_call_from_func_element(func):
         return None
 
 
-def make_calls(lines) -> list[Call]:
-    """
-    Given a list of lines, find all calls in this list.
-
-    :param lines list[ast]:
-    :rtype: list[Call]
-    """
-
-    calls = []
-    for tree in lines:
-        for element in ast.walk(tree):
-            if type(element) != ast.Call:
-                continue
-            call = get_call_from_func_element(element.func)
-            if call:
-                calls.append(call)
-    return calls
-
-
 def process_assign(element):
     """
     Given an element from the ast which is an assignment statement, return a
@@ -104,29 +86,34 @@ def process_import(element):
     return ret
 
 
-def make_local_variables(lines, parent):
+def make_calls_and_variables(lines, parent):
     """
-    Given an ast of all the lines in a function, generate a list of
-    variables in that function. Variables are tokens and what they link to.
-    In this case, what it links to is just a string. However, that is resolved
-    later.
+    Calls, assignments and imports of a scope, collected in one breadth first
+    ast.walk over lines instead of one walk for calls and another for variables.
+    The statements in lines were already iterated (not walked) by
+    separate_namespaces to split the scope, so they are seen twice.
+    Everything below them is visited once.
 
     :param lines list[ast]:
     :param parent Group:
-    :rtype: list[Variable]
+    :rtype: (list[Call], list[Variable])
     """
+    calls = []
     variables = []
     for tree in lines:
         for element in ast.walk(tree):
-            if type(element) == ast.Assign:
+            element_type = type(element)
+            if element_type == ast.Call:
+                call = get_call_from_func_element(element.func)
+                if call:
+                    calls.append(call)
+            elif element_type == ast.Assign:
                 variables += process_assign(element)
-            if type(element) in (ast.Import, ast.ImportFrom):
+            elif element_type in (ast.Import, ast.ImportFrom):
                 variables += process_import(element)
     if parent.group_type == GROUP_TYPE.CLASS:
         variables.append(Variable('self', parent, lines[0].lineno))
-
-    variables = list(filter(None, variables))
-    return variables
+    return calls, variables
 
 
 def get_inherits(tree):
@@ -146,19 +133,22 @@ class Python(BaseLanguage):
         pass
 
     @staticmethod
-    def get_tree(filename):
+    def get_tree(filename, content=None):
         """
         Get the entire AST for this file
 
         :param filename str:
+        :param content bytes: the contents of the file if already read. Decoded
+                              the same way open() would decode the file
         :rtype: ast
         """
+        if content is None:
+            with open(filename, 'rb') as f:
+                content = f.read()
         try:
-            with open(filename) as f:
-                raw = f.read()
+            raw = io.TextIOWrapper(io.BytesIO(content)).read()
         except ValueError:
-            with open(filename, encoding='UTF-8') as f:
-                raw = f.read()
+            raw = io.TextIOWrapper(io.BytesIO(content), encoding='UTF-8').read()
         return ast.parse(raw)
 
     @staticmethod
@@ -202,8 +192,7 @@ class Python(BaseLanguage):
         """
         token = tree.name
         line_number = tree.lineno
-        calls = make_calls(tree.body)
-        variables = make_local_variables(tree.body, parent)
+        calls, variables = make_calls_and_variables(tree.body, parent)
         is_constructor = parent.group_type == GROUP_TYPE.CLASS and token in ['__init__', '__new__']
         import_tokens = []
         if parent.group_type == GROUP_TYPE.FILE:
@@ -224,8 +213,7 @@ class Python(BaseLanguage):
         """
         token = "(global)"
         line_number = 0
-        calls = make_calls(lines)
-        variables = make_local_variables(lines, parent)
+        calls, variables = make_calls_and_variables(lines, parent)
         return Node(token, calls, variables, line_number=line_number, parent=parent, node=None)
 
     @staticmethod
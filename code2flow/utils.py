@@ -1,21 +1,30 @@
 
 from collections import defaultdict, deque
 import json
+import os
 
+from .csr import CSRGraph
+from .database import GraphDatabase
 from .engine import code2flow
+from .model import SourceSpan
 
 
-def generate_graph(root_folder, output_dir, generate_image=True, generate_json=True, silent=False):
+def generate_graph(root_folder, output_dir, generate_image=True, generate_json=True, silent=False,
+                   generate_binary=False, generate_database=False):
     """
     Writes call graph to output_dir/call_graph.json
     Writes image to output_dir/call_graph.png
+    Writes binary call graph to output_dir/call_graph.bin if generate_binary
+    Updates the call graph database output_dir/call_graph.db if generate_database
     """
     code2flow(
         raw_source_paths=root_folder,
         output_dir=output_dir,
         generate_json=generate_json,
         generate_image=generate_image,
-        silent=silent
+        silent=silent,
+        generate_binary=generate_binary,
+        generate_database=generate_database
     )
 
 
@@ -34,6 +43,53 @@ def get_call_graph(output_dir) -> dict:
             'Call graph not found. Please run generate_graph first.')
 
 
+def get_binary_call_graph(output_dir) -> CSRGraph:
+    """
+    Memory-maps call_graph.bin (written with generate_binary=True).
+    Opening is instant and callers / callees of a single function are read
+    without loading the rest of the graph. Function content is not included.
+    Close the graph (or use it as a context manager) when done.
+    """
+    try:
+        return CSRGraph(f'{output_dir}/call_graph.bin')
+    except FileNotFoundError:
+        raise Exception(
+            'Binary call graph not found. Please run generate_graph with generate_binary=True first.')
+
+
+def get_graph_database(output_dir) -> GraphDatabase:
+    """
+    Opens call_graph.db (written with generate_database=True).
+    It answers get_file_to_functions, get_parent_dependencies and callee
+    expansion as indexed queries without loading the graph.
+    The connection is read-only, so it never waits on a run that is updating it.
+    """
+    file_name = f'{output_dir}/call_graph.db'
+    if not os.path.exists(file_name):
+        raise Exception(
+            'Call graph database not found. Please run generate_graph with generate_database=True first.')
+    return GraphDatabase(file_name, readonly=True)
+
+
+def get_function_content(output_dir, entry) -> str:
+    """
+    The source of one function in the call graph, read only when asked for.
+    Works for every content mode the graph was written with:
+    inline 'content', a 'content_ref' into the call_graph.<id>.content sidecar
+    or a 'span' of the function's source file.
+    """
+    if 'content' in entry:
+        return entry['content']
+    if 'content_ref' in entry:
+        sidecar_name, offset, length = entry['content_ref']
+        with open(f'{output_dir}/{sidecar_name}', 'rb') as f:
+            f.seek(offset)
+            return f.read(length).decode('utf-8')
+    if entry.get('span'):
+        return SourceSpan(entry['file_name'], *entry['span']).read()
+    return ''
+
+
 def get_file_to_functions(graph) -> dict:
     """
     Converts call graph to a file to functions mapping of the form:
@@ -0,0 +1,133 @@
+import logging
+import os
+import threading
+
+from .cache import ExtractionCache, CACHE_DIR_NAME, DEFAULT_CACHE_SIZE_LIMIT
+from .engine import iter_sources, write_outputs
+from .incremental import IncrementalModel
+
+
+def _snapshot(raw_source_paths, **discovery):
+    """
+    Stat every source file. Two snapshots differ when a file was added,
+    deleted or modified in between.
+
+    :param list[str] raw_source_paths:
+    :param discovery: exclude_paths, max_file_size and use_gitignore, passed to iter_sources
+    :rtype: dict[str, (int, int)]: source -> (mtime_ns, size)
+    """
+    ret = {}
+    for source in iter_sources(raw_source_paths, **discovery):
+        try:
+            stat = os.stat(source)
+        except FileNotFoundError:
+            continue
+        ret[source] = (stat.st_mtime_ns, stat.st_size)
+    return ret
+
+
+def _diff(old, new):
+    """
+    :param dict old: snapshot
+    :param dict new: snapshot
+    :rtype: (list[str], list[str], list[str]): added, modified, deleted
+    """
+    added = [s for s in new if s not in old]
+    modified = [s for s in new if s in old and new[s] != old[s]]
+    deleted = [s for s in old if s not in new]
+    return added, modified, deleted
+
+
+def watch(raw_source_paths, output_dir, no_trimming=False, skip_parse_errors=True,
+          workers=1, use_cache=False, cache_dir=None,
+          cache_size_limit=DEFAULT_CACHE_SIZE_LIMIT, interval=1.0, debounce=0.5,
+          level=logging.INFO, silent=False, stop_event=None, generate_database=False,
+          exclude_paths=None, max_file_size=None, use_gitignore=True):
+    """
+    Long-running mode. Keep the model in memory, poll the source tree and
+    rewrite output_dir/call_graph.json after every batch of changes.
+    Changes are applied once the tree has been quiet for `debounce` seconds.
+    The json file is replaced atomically so readers always see a complete graph.
+    Runs until stop_event is set or the process is interrupted.
+
+    :param list[str] raw_source_paths: file or directory paths
+    :param str output_dir: path to the output dir.
+    :param bool no_trimming: Don't trim orphaned functions / namespaces
+    :param bool skip_parse_errors: If a language parser fails to parse a file, skip it
+    :param int workers: number of processes used to parse files
+    :param bool use_cache: Reuse what was extracted from unchanged files in earlier runs
+    :param str cache_dir: Where the extraction cache lives. Defaults to output_dir/extraction_cache
+    :param int cache_size_limit: Size in bytes the extraction cache is trimmed down to
+    :param float interval: seconds between polls of the source tree
+    :param float debounce: seconds the tree must be unchanged before updating
+    :param int level: logging level
+    :param bool silent:
+    :param threading.Event stop_event: set to stop watching
+    :param bool generate_database: Also keep output_dir/call_graph.db up to date.
+        Every update only rewrites the rows that changed
+    :param list exclude_paths: Glob patterns of files and directories to skip
+    :param int max_file_size: Skip files larger than this many bytes (e.g. generated code)
+    :param bool use_gitignore: Skip files excluded by .gitignore files
+    :rtype: None
+    """
+    if not isinstance(raw_source_paths, list):
+        raw_source_paths = [raw_source_paths]
+    stop_event = stop_event or threading.Event()
+    # The same files as a one-shot code2flow() run with these options
+    discovery = dict(exclude_paths=exclude_paths, max_file_size=max_file_size,
+                     use_gitignore=use_gitignore)
+
+    logging.basicConfig(format="Code2Flow: %(message)s", level=level)
+    if silent:
+        logging.disable(logging.CRITICAL + 1)
+
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    cache = None
+    if use_cache:
+        cache = ExtractionCache(cache_dir or os.path.join(output_dir, CACHE_DIR_NAME),
+                                size_limit=cache_size_limit)
+
+    def build(snapshot):
+        model = IncrementalModel(raw_source_paths, sorted(snapshot), no_trimming=no_trimming,
+                                 skip_parse_errors=skip_parse_errors, workers=workers,
+                                 cache=cache)
+        write_outputs(output_dir, *model.graph(), generate_image=False,
+                      generate_database=generate_database)
+        return model
+
+    known = _snapshot(raw_source_paths, **discovery)
+    model = build(known)
+    logging.info("Watching %d source file(s) for changes.", len(known))
+
+    try:
+        while not stop_event.wait(interval):
+            current = _snapshot(raw_source_paths, **discovery)
+            if current == known:
+                continue
+            while not stop_event.wait(debounce):
+                latest = _snapshot(raw_source_paths, **discovery)
+                if latest == current:
+                    break
+                current = latest
+            if stop_event.is_set():
+                break
+
+            added, modified, deleted = _diff(known, current)
+            logging.info("Detected %d added, %d modified and %d deleted file(s).",
+                         len(added), len(modified), len(deleted))
+            known = current
+            try:
+                if model is None:
+                    model = build(current)
+                else:
+                    graph = model.update(added, modified, deleted)
+                    write_outputs(output_dir, *graph, generate_image=False,
+                                  generate_database=generate_database)
+            except Exception:
+                # The model may be half updated. Rebuild it on the next change.
+                logging.exception("Could not update the call graph. Keeping the previous one.")
+                model = None
+    except KeyboardInterrupt:
+        pass